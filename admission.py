@@ -0,0 +1,119 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# ============================================================
+#        ДОПУСК ЗАДАЧ: КВОТИ, БЮДЖЕТ, ПРІОРИТЕТ ЗА ПІДПИСКОЮ
+# ============================================================
+# Перед чергою завантажень кожен запит проходить три перевірки:
+#   1) частота запитів користувача (ковзне вікно);
+#   2) байти, скачані для користувача за останні 24 години;
+#   3) загальний бюджет задач у роботі: безкоштовні займають лише частку,
+#      решта лишається для платних тарифів.
+# Те, що бот не встигне виконати, відхиляється одразу, а не висить у черзі.
+
+ADMITTED = "admitted"
+RATE_LIMITED = "rate_limited"
+OVER_QUOTA = "over_quota"
+BUSY = "busy"
+
+DAY = 24 * 3600
+HOUR = 3600
+
+
+class Tier:
+    def __init__(self, name, rate, daily_bytes, priority, budget_share, window=60):
+        self.name = name
+        self.rate = rate                  # запитів за window секунд
+        self.window = window
+        self.daily_bytes = daily_bytes    # 0 — без ліміту
+        self.priority = priority          # менше — раніше з черги
+        self.budget_share = budget_share  # яку частку загального бюджету можна займати
+
+
+class Admission:
+    def __init__(self, path, tiers, default_tier, budget, load):
+        self.tiers = tiers
+        self.default_tier = default_tier
+        self.budget = max(1, budget)
+        self.load = load                  # () -> задач у черзі + у роботі
+        self.lock = threading.Lock()
+        self.requests = {}                # uid -> deque часу запитів
+        self.db_lock = threading.Lock()
+        self.writes = 0
+        # Байти рахують і воркери в інших процесах — тому в SQLite, погодинно
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage ("
+            "uid TEXT NOT NULL, hour INTEGER NOT NULL, bytes INTEGER NOT NULL, PRIMARY KEY (uid, hour))"
+        )
+        self.conn.commit()
+
+    def tier(self, user):
+        return self.tiers.get(user.get("subscription")) or self.tiers[self.default_tier]
+
+    def check(self, user, n=1):
+        """(статус, деталь): для RATE_LIMITED — скільки секунд чекати, для OVER_QUOTA — ліміт у байтах."""
+        tier = self.tier(user)
+        uid = str(user["id"])
+        now = time.monotonic()
+        with self.lock:
+            q = self.requests.get(uid)
+            if q is None:
+                if len(self.requests) > 10000:
+                    self._prune(now)
+                q = self.requests[uid] = deque()
+            while q and now - q[0] > tier.window:
+                q.popleft()
+            if len(q) + n > tier.rate:
+                return RATE_LIMITED, max(1, int(tier.window - (now - q[0])) + 1) if q else tier.window
+
+        if tier.daily_bytes and self.used_bytes(uid) >= tier.daily_bytes:
+            return OVER_QUOTA, tier.daily_bytes
+
+        if self.load() + n > self.budget * tier.budget_share:
+            return BUSY, None
+
+        with self.lock:
+            q.extend([now] * n)
+        return ADMITTED, None
+
+    def record_bytes(self, uid, n):
+        if not n:
+            return
+        hour = int(time.time() // HOUR)
+        try:
+            with self.db_lock:
+                self.conn.execute(
+                    "INSERT INTO usage (uid, hour, bytes) VALUES (?, ?, ?) "
+                    "ON CONFLICT(uid, hour) DO UPDATE SET bytes = bytes + excluded.bytes",
+                    (str(uid), hour, int(n))
+                )
+                self.writes += 1
+                if self.writes % 100 == 0:
+                    self.conn.execute("DELETE FROM usage WHERE hour <= ?", (hour - DAY // HOUR,))
+                self.conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"USAGE WRITE ERROR: {e}")
+
+    def used_bytes(self, uid):
+        since = int(time.time() // HOUR) - DAY // HOUR
+        try:
+            with self.db_lock:
+                row = self.conn.execute(
+                    "SELECT COALESCE(SUM(bytes), 0) FROM usage WHERE uid = ? AND hour > ?", (str(uid), since)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"USAGE READ ERROR: {e}")
+            return 0
+        return row[0]
+
+    def _prune(self, now):
+        # Вікна неактивних користувачів уже порожні — прибираємо
+        longest = max(t.window for t in self.tiers.values())
+        for uid, q in list(self.requests.items()):
+            if not q or now - q[-1] > longest:
+                del self.requests[uid]
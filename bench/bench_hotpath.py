@@ -0,0 +1,105 @@
+"""Вартість обробки звичайного (не-URL) повідомлення: до і після індексу команд
+та кешу клавіатур.
+
+    python bench/bench_hotpath.py [кількість повторів]
+"""
+import os
+import re
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TOKEN", "123456:bench")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench_data_"))
+
+import main  # noqa: E402
+from telebot import types  # noqa: E402
+
+
+# ---------------- Стара реалізація (для порівняння) ----------------
+
+def legacy_clean_text(text):
+    return re.sub(r"[^a-zA-Zа-яА-ЯіІїЇєЄ0-9]+", "", text or "").lower()
+
+
+def legacy_match_cmd(text):
+    text = legacy_clean_text(text)
+    for cmd, variants in main.CMD.items():
+        for v in variants:
+            if legacy_clean_text(v) == text:
+                return cmd
+    return None
+
+
+def legacy_main_menu(user):
+    t = main.texts[user["language"]]
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.row(f"📋 {t['menu']}", f"👤 {t['profile']}")
+    kb.row(f"⚙️ {t['settings']}", f"💎 {t['subscription']}")
+    kb.row(f"🌍 {t['language']}", f"ℹ️ {t['help']}")
+    return kb.to_json()  # те, що робить apihelper при кожній відправці
+
+
+def legacy_settings_keyboard(user):
+    t = main.texts[user["language"]]
+    kb = types.InlineKeyboardMarkup()
+    kb.row(
+        types.InlineKeyboardButton(f"{'✅ ' if user['format']=='mp4' else ''}MP4", callback_data="format_mp4"),
+        types.InlineKeyboardButton(f"{'✅ ' if user['format']=='mp3' else ''}MP3", callback_data="format_mp3")
+    )
+    state = t["yes"] if user["video_plus_audio"] else t["no"]
+    kb.add(types.InlineKeyboardButton(f"{t['lbl_video_plus_audio']}: {state}", callback_data="toggle_vpa"))
+    state = t["yes"] if user["albums"] else t["no"]
+    kb.add(types.InlineKeyboardButton(f"{t['lbl_albums']}: {state}", callback_data="toggle_albums"))
+    kb.add(types.InlineKeyboardButton(f"⬅ {t['back']}", callback_data="cmd_back"))
+    return kb.to_json()
+
+
+# ---------------- Вибірка повідомлень ----------------
+
+def sample_messages():
+    msgs = []
+    for lang, t in main.texts.items():
+        msgs += [f"📋 {t['menu']}", f"👤 {t['profile']}", f"⚙️ {t['settings']}",
+                 f"💎 {t['subscription']}", f"🌍 {t['language']}", f"ℹ️ {t['help']}"]
+    msgs += ["привіт", "hello there", "що це?", "/unknown", "😀😀😀"]
+    return msgs
+
+
+def per_message(fn, messages, number):
+    total = timeit.timeit(lambda: [fn(m) for m in messages], number=number)
+    return total / (number * len(messages)) * 1e6
+
+
+def main_bench(number):
+    messages = sample_messages()
+    users = [{"language": lang, "format": fmt, "video_plus_audio": vpa, "albums": albums}
+             for lang in main.texts for fmt in ("mp4", "mp3") for vpa in (True, False) for albums in (True, False)]
+
+    for m in messages:
+        assert legacy_match_cmd(m) == main.match_cmd(m), m
+    for u in users:
+        assert legacy_main_menu(u) == main.main_menu(u)
+        assert legacy_settings_keyboard(u) == main.settings_keyboard(u)
+
+    rows = [
+        ("match_cmd", per_message(legacy_match_cmd, messages, number), per_message(main.match_cmd, messages, number)),
+        ("main_menu", per_message(legacy_main_menu, users, number), per_message(main.main_menu, users, number)),
+        ("settings_keyboard", per_message(legacy_settings_keyboard, users, number),
+         per_message(main.settings_keyboard, users, number)),
+    ]
+    print(f"{'stage':<20}{'before, µs':>12}{'after, µs':>12}{'speedup':>10}")
+    before_total = after_total = 0
+    for name, before, after in rows:
+        before_total += before
+        after_total += after
+        print(f"{name:<20}{before:>12.2f}{after:>12.2f}{before / after:>9.1f}x")
+    # Типове повідомлення: розпізнати команду + відповісти з головним меню
+    before_msg = rows[0][1] + rows[1][1]
+    after_msg = rows[0][2] + rows[1][2]
+    print(f"{'per message':<20}{before_msg:>12.2f}{after_msg:>12.2f}{before_msg / after_msg:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,124 @@
+"""Профілі завантаження проти однакових опцій yt-dlp для всіх сайтів: локальний
+сервер з HLS-плейлистом і прогресивним mp4 (Range), затримкою на запит і
+обмеженою швидкістю кожного з'єднання.
+
+    python bench/bench_profiles.py [--segments 30] [--latency 0.1] [--bps 400000]
+
+Прогресивний файл пришвидшується лише з aria2c у PATH (кілька Range-з'єднань);
+без нього обидва варіанти качають одним з'єднанням.
+
+Наприкінці — перевірка пулу YoutubeDL: ініціалізація YoutubeIE в кожній задачі
+не повинна накопичувати close-хуки на одному екземплярі.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import yt_dlp  # noqa: E402
+
+from fakes import MediaServer, make_clip  # noqa: E402
+from profiles import ydl_options, aria2c_available  # noqa: E402
+from ydlpool import YdlPool  # noqa: E402
+
+# Що було в main.py до профілів: один набір опцій на всі платформи
+BASELINE = {}
+
+
+def make_hls(clip, out_dir, segment_seconds=1):
+    subprocess.run([
+        # Ключовий кадр щосекунди, інакше сегменти виходять по 10 с
+        "ffmpeg", "-y", "-loglevel", "error", "-i", clip,
+        "-c:v", "libx264", "-preset", "ultrafast", "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+        "-c:a", "copy",
+        "-f", "hls", "-hls_time", str(segment_seconds), "-hls_list_size", "0",
+        "-hls_segment_filename", os.path.join(out_dir, "seg%03d.ts"),
+        os.path.join(out_dir, "stream.m3u8")
+    ], check=True)
+
+
+def download(url, opts, work):
+    dst = tempfile.mkdtemp(dir=work)
+    params = {
+        "quiet": True, "noprogress": True, "no_warnings": True,
+        "outtmpl": os.path.join(dst, "%(id)s.%(ext)s"),
+        # Міряємо мережу: без ремуксу MPEG-TS у mp4 після завантаження
+        "fixup": "never",
+    }
+    params.update(opts)
+    started = time.perf_counter()
+    with yt_dlp.YoutubeDL(params) as ydl:
+        ydl.download([url])
+    elapsed = time.perf_counter() - started
+    size = sum(os.path.getsize(os.path.join(dst, f)) for f in os.listdir(dst))
+    shutil.rmtree(dst, ignore_errors=True)
+    return elapsed, size
+
+
+def check_close_hooks(sessions=5):
+    """Кількість close-хуків пулового екземпляра після кожної задачі YouTube."""
+    pool = YdlPool()
+    counts = []
+    for _ in range(sessions):
+        with pool.session("Youtube", ydl_options("Youtube")) as ydl:
+            # Те, що робить extract_info перед першим запитом; мережі не потребує
+            ydl.get_info_extractor("Youtube").initialize()
+            counts.append(len(ydl._close_hooks))
+    return counts, pool.stats()["created"]
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--segments", type=int, default=30, help="тривалість кліпу = кількість HLS-сегментів")
+    p.add_argument("--latency", type=float, default=0.1, help="затримка сервера на запит, с")
+    p.add_argument("--bps", type=float, default=400_000, help="швидкість одного з'єднання, байт/с")
+    p.add_argument("--repeat", type=int, default=2)
+    args = p.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        sys.exit("ffmpeg is required to build the HLS stream")
+
+    work = tempfile.mkdtemp(prefix="bench_profiles_")
+    try:
+        www = os.path.join(work, "www")
+        os.makedirs(www)
+        make_clip(os.path.join(www, "movie.mp4"), seconds=args.segments, size="640x360")
+        make_hls(os.path.join(www, "movie.mp4"), www)
+        segments = len([f for f in os.listdir(www) if f.endswith(".ts")])
+        server = MediaServer(www, latency=args.latency, bps=args.bps)
+        print(f"HLS: {segments} segments, progressive: {os.path.getsize(os.path.join(www, 'movie.mp4'))} bytes, "
+              f"latency {args.latency}s, {args.bps / 1000:.0f} KB/s per connection, "
+              f"aria2c {'present' if aria2c_available() else 'absent'}")
+
+        cases = [
+            ("hls", server.url + "/stream.m3u8"),
+            ("progressive", server.url + "/movie.mp4"),
+        ]
+        print(f"{'source':<12} {'options':<10} {'best, s':>8} {'MB/s':>6}")
+        for name, url in cases:
+            results = {}
+            for label, opts in (("baseline", BASELINE), ("profile", ydl_options("Generic"))):
+                runs = [download(url, opts, work) for _ in range(args.repeat)]
+                best = min(t for t, _ in runs)
+                results[label] = best
+                print(f"{name:<12} {label:<10} {best:>8.2f} {runs[0][1] / best / 1e6:>6.2f}")
+            print(f"{name:<12} {'speedup':<10} {results['baseline'] / results['profile']:>7.2f}x")
+        server.stop()
+
+        counts, created = check_close_hooks()
+        print(f"pooled YoutubeDL close hooks per session: {counts} ({created} instance)")
+        if len(set(counts)) != 1:
+            sys.exit("close hooks accumulate on pooled YoutubeDL instances")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Холодний старт бота: скільки від запуску процесу до першої відповіді вебхука
+і до першого надісланого відео, з пулом YoutubeDL і прогрівом та без них.
+
+    python bench/bench_startup.py [--runs 3] [--delay 0]
+
+--delay — пауза між готовністю вебхука і першим посиланням (0 — посилання
+приходить одразу, як на Render, коли бота будить саме воно).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import shutil
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeBotAPI, MediaServer, make_clip  # noqa: E402
+from loadtest import BOT_SERVER, CHAT_BASE, MEDIA_METHODS, TOKEN, free_port, make_update  # noqa: E402
+
+MODES = {
+    "pool+warmup": {"YDL_POOL": "1"},
+    "per-job ydl": {"YDL_POOL": "0", "YDL_WARM_PROFILES": ""},
+}
+
+
+def wait_for(predicate, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if predicate():
+            return time.perf_counter()
+        time.sleep(0.01)
+    return None
+
+
+def delivered(api, chat):
+    return any(c[1] in MEDIA_METHODS and c[4] == 200 for c in api.calls_for(chat))
+
+
+def run_once(mode_env, api, media, work, delay):
+    port = free_port()
+    env = dict(os.environ, TOKEN=TOKEN, BOT_API_URL=api.url, DATA_DIR=tempfile.mkdtemp(dir=work),
+               WORKER_PROCESSES="0", PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    env.pop("WEBHOOK_SECRET", None)
+    env.update(mode_env)
+    base = f"http://127.0.0.1:{port}"
+    api.reset()
+
+    started = time.perf_counter()
+    bot = subprocess.Popen([sys.executable, "-c", BOT_SERVER, str(port)], cwd=work, env=env)
+    try:
+        def ready():
+            try:
+                return requests.get(base + "/", timeout=1).status_code == 200
+            except requests.RequestException:
+                return False
+        ready_at = wait_for(ready)
+        if ready_at is None:
+            sys.exit("bot process did not start")
+        time.sleep(delay)
+
+        # Два посилання поспіль у різні чати і на різні файли (кеш file_id не допоможе)
+        result = [ready_at - started]
+        for n in range(2):
+            chat = CHAT_BASE + n
+            body = json.dumps(make_update(n, f"{media.url}/clip_{n}.mp4"))
+            sent = time.perf_counter()
+            requests.post(f"{base}/{TOKEN}", data=body, headers={"Content-Type": "application/json"}, timeout=10)
+            done = wait_for(lambda: delivered(api, chat))
+            if done is None:
+                sys.exit(f"job {n} was not delivered")
+            result.append(done - sent)
+        return result
+    finally:
+        bot.terminate()
+        bot.wait()
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--delay", type=float, default=0.0, help="пауза після готовності вебхука, с")
+    args = p.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        media_root = os.path.join(work, "media")
+        os.makedirs(media_root)
+        clip = make_clip(os.path.join(media_root, "clip_0.mp4"))
+        shutil.copyfile(clip, os.path.join(media_root, "clip_1.mp4"))
+        api = FakeBotAPI(latency=0.0)
+        media = MediaServer(media_root)
+
+        print(f"{'mode':<14}{'webhook ready, s':>18}{'first job, s':>15}{'second job, s':>15}")
+        for name, mode_env in MODES.items():
+            runs = [run_once(mode_env, api, media, work, args.delay) for _ in range(args.runs)]
+            ready, first, second = (statistics.median(col) for col in zip(*runs))
+            print(f"{name:<14}{ready:>18.2f}{first:>15.2f}{second:>15.2f}")
+        api.stop()
+        media.stop()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Локальні замінники зовнішніх сервісів для бенчмарків:
+
+FakeBotAPI  — записує виклики Bot API, імітує затримку, 429, 5xx і ліміт розміру.
+MediaServer — віддає згенеровані відеофайли з підтримкою Range-запитів.
+"""
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Клієнт закрив keep-alive з'єднання — це не помилка сервера
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+def _start(server):
+    threading.Thread(target=server.serve_forever, name=type(server).__name__, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ============================================================
+#                      FAKE BOT API
+# ============================================================
+
+class FakeBotAPI:
+    def __init__(self, latency=0.02, upload_bps=None, rate_429=0.0, retry_after=1, size_limit=50 * 1024 * 1024,
+                 rate_5xx=0.0):
+        self.latency = latency
+        self.upload_bps = upload_bps
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.size_limit = size_limit
+        self.lock = threading.Lock()
+        self.calls = []          # (час, метод, chat_id, байтів у тілі, статус)
+        self.message_id = 0
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.do_POST()
+
+            def do_POST(self):
+                api._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server(("127.0.0.1", 0), Handler)
+        self.url = _start(self.server)
+
+    def stop(self):
+        self.server.shutdown()
+
+    def reset(self):
+        with self.lock:
+            self.calls = []
+
+    def calls_for(self, chat_id):
+        with self.lock:
+            return [c for c in self.calls if c[2] == chat_id]
+
+    def _next_id(self):
+        with self.lock:
+            self.message_id += 1
+            return self.message_id
+
+    def _handle(self, req):
+        parts = urlsplit(req.path)
+        m = re.match(r"^/bot[^/]+/(\w+)$", parts.path)
+        method = m.group(1) if m else "unknown"
+        params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        length = int(req.headers.get("Content-Length") or 0)
+
+        # Читаємо тіло шматками (можливо, з обмеженням швидкості), нічого не зберігаємо
+        left = length
+        while left:
+            chunk = req.rfile.read(min(left, 256 * 1024))
+            if not chunk:
+                break
+            left -= len(chunk)
+            if self.upload_bps:
+                time.sleep(len(chunk) / self.upload_bps)
+        if self.latency:
+            time.sleep(self.latency)
+
+        chat_id = params.get("chat_id")
+        chat_id = int(chat_id) if chat_id and chat_id.lstrip("-").isdigit() else chat_id
+
+        if length > self.size_limit:
+            status, body = 413, {"ok": False, "error_code": 413, "description": "Request Entity Too Large"}
+        elif self.rate_5xx and random.random() < self.rate_5xx:
+            status, body = 502, {"ok": False, "error_code": 502, "description": "Bad Gateway"}
+        elif self.rate_429 and random.random() < self.rate_429:
+            status, body = 429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after}
+            }
+        else:
+            status, body = 200, {"ok": True, "result": self._result(method, chat_id, params)}
+
+        with self.lock:
+            self.calls.append((time.perf_counter(), method, chat_id, length, status))
+
+        data = json.dumps(body).encode()
+        req.send_response(status)
+        req.send_header("Content-Type", "application/json")
+        req.send_header("Content-Length", str(len(data)))
+        req.end_headers()
+        req.wfile.write(data)
+
+    def _message(self, chat_id, **extra):
+        msg = {
+            "message_id": self._next_id(), "date": int(time.time()),
+            "chat": {"id": chat_id or 0, "type": "private"}
+        }
+        msg.update(extra)
+        return msg
+
+    def _result(self, method, chat_id, params):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        if method in ("deleteMessage", "setWebhook", "deleteWebhook", "answerCallbackQuery"):
+            return True
+        if method == "sendVideo":
+            fid = params.get("video") or f"video-{self.message_id + 1}"
+            return self._message(chat_id, video={
+                "file_id": fid, "file_unique_id": fid, "width": 320, "height": 240, "duration": 3})
+        if method == "sendAudio":
+            fid = params.get("audio") or f"audio-{self.message_id + 1}"
+            return self._message(chat_id, audio={"file_id": fid, "file_unique_id": fid, "duration": 3})
+        if method == "sendMediaGroup":
+            media = json.loads(params.get("media") or "[]")
+            out = []
+            for item in media:
+                mid = self.message_id + 1
+                if item.get("type") == "photo":
+                    out.append(self._message(chat_id, photo=[{
+                        "file_id": f"photo-{mid}", "file_unique_id": f"photo-{mid}", "width": 1, "height": 1}]))
+                else:
+                    out.append(self._message(chat_id, video={
+                        "file_id": f"video-{mid}", "file_unique_id": f"video-{mid}",
+                        "width": 320, "height": 240, "duration": 3}))
+            return out
+        return self._message(chat_id, text=params.get("text", ""))
+
+
+# ============================================================
+#                      MEDIA SERVER
+# ============================================================
+
+def make_clip(path, seconds=3, size="320x240"):
+    """Справжній MP4 (H.264 + AAC), якщо є ffmpeg, інакше — випадкові байти."""
+    if shutil.which("ffmpeg"):
+        subprocess.run([
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"testsrc=size={size}:rate=25",
+            "-f", "lavfi", "-i", "sine=frequency=440",
+            "-t", str(seconds), "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest", path
+        ], check=True)
+    else:
+        with open(path, "wb") as f:
+            f.write(os.urandom(64 * 1024 * seconds))
+    return path
+
+
+class MediaServer:
+    """Статичні файли з каталогу root; підтримує Range і затримку на запит."""
+
+    def __init__(self, root, latency=0.0, bps=None):
+        self.root = root
+        self.latency = latency
+        self.bps = bps
+        self.lock = threading.Lock()
+        self.requests = 0
+        media = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_HEAD(self):
+                media._serve(self, head=True)
+
+            def do_GET(self):
+                media._serve(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server(("127.0.0.1", 0), Handler)
+        self.url = _start(self.server)
+
+    def stop(self):
+        self.server.shutdown()
+
+    def _serve(self, req, head=False):
+        with self.lock:
+            self.requests += 1
+        path = os.path.join(self.root, urlsplit(req.path).path.lstrip("/"))
+        if not os.path.isfile(path):
+            req.send_response(404)
+            req.send_header("Content-Length", "0")
+            req.end_headers()
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        rng = re.match(r"bytes=(\d*)-(\d*)", req.headers.get("Range") or "")
+        if rng and (rng.group(1) or rng.group(2)):
+            if rng.group(1):
+                start = int(rng.group(1))
+                end = int(rng.group(2)) if rng.group(2) else size - 1
+            else:
+                start = max(0, size - int(rng.group(2)))
+            end = min(end, size - 1)
+            req.send_response(206)
+            req.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            req.send_response(200)
+        ctype = {"m3u8": "application/vnd.apple.mpegurl", "ts": "video/mp2t"}.get(path.rsplit(".", 1)[-1], "video/mp4")
+        req.send_header("Content-Type", ctype)
+        req.send_header("Accept-Ranges", "bytes")
+        req.send_header("Content-Length", str(end - start + 1))
+        req.end_headers()
+        if head:
+            return
+        with open(path, "rb") as f:
+            f.seek(start)
+            left = end - start + 1
+            while left > 0:
+                chunk = f.read(min(left, 64 * 1024))
+                if not chunk:
+                    break
+                try:
+                    req.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                left -= len(chunk)
+                if self.bps:
+                    time.sleep(len(chunk) / self.bps)
@@ -0,0 +1,279 @@
+"""Навантажувальний тест бота без мережі: фейковий Bot API, локальний медіасервер
+і генератор апдейтів, що шле JSON у webhook-маршрут Flask.
+
+    python bench/loadtest.py --updates 500 --concurrency 20 --url-share 0.1
+
+Звіт: апдейтів/с, p50/p99 часу до першої відповіді бота і наскрізна
+затримка завантажень (від POST до останнього надісланого медіа).
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeBotAPI, MediaServer, make_clip  # noqa: E402
+
+TEXTS = ["/start", "📋 Menu", "👤 Profile", "⚙️ Settings", "ℹ️ Help", "hello"]
+MEDIA_METHODS = ("sendVideo", "sendAudio", "sendMediaGroup")
+CHAT_BASE = 1_000_000
+TOKEN = "123456:loadtest"
+
+BOT_SERVER = """
+import logging, sys
+import main
+from werkzeug.serving import make_server
+logging.getLogger().setLevel(logging.WARNING)
+logging.getLogger("werkzeug").setLevel(logging.ERROR)
+make_server("127.0.0.1", int(sys.argv[1]), main.app, threaded=True).serve_forever()
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(base, proc, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"bot process exited with code {proc.returncode}")
+        try:
+            requests.get(base + "/", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    sys.exit("bot process did not start")
+
+
+def scrape(base):
+    """Значення з /metrics бота: {(ім'я, мітки): число}."""
+    out = {}
+    for line in requests.get(base + "/metrics", timeout=5).text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            out[name] = float(value)
+    return out
+
+
+def idle(base):
+    stats = scrape(base)
+    return not stats.get("dowlander_download_queue_depth") and not stats.get("dowlander_download_workers_active")
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[k]
+
+
+def make_update(i, text):
+    chat = CHAT_BASE + i
+    return {
+        "update_id": 10_000 + i,
+        "message": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": chat, "type": "private", "first_name": "Load"},
+            "from": {"id": chat, "is_bot": False, "first_name": "Load", "language_code": "en"},
+            "text": text
+        }
+    }
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--updates", type=int, default=300, help="скільки апдейтів надіслати")
+    p.add_argument("--concurrency", type=int, default=16, help="паралельних POST-клієнтів")
+    p.add_argument("--url-share", type=float, default=0.1, help="частка апдейтів із посиланням")
+    p.add_argument("--distinct-urls", type=int, default=5, help="різних відео (повтори йдуть через кеш)")
+    p.add_argument("--clip-seconds", type=int, default=3)
+    p.add_argument("--api-latency", type=float, default=0.02, help="затримка фейкового Bot API, с")
+    p.add_argument("--upload-bps", type=float, default=None, help="швидкість прийому файлів Bot API, байт/с")
+    p.add_argument("--rate-429", type=float, default=0.0, help="ймовірність відповіді 429")
+    p.add_argument("--rate-5xx", type=float, default=0.0, help="ймовірність відповіді 502")
+    p.add_argument("--size-limit", type=float, default=50, help="ліміт тіла запиту Bot API, МБ")
+    p.add_argument("--media-latency", type=float, default=0.0, help="затримка медіасервера, с")
+    p.add_argument("--worker-processes", type=int, default=0, help="WORKER_PROCESSES бота (0 — один процес)")
+    p.add_argument("--tg-rate", type=float, default=None, help="перевизначити TG_GLOBAL_RATE бота")
+    p.add_argument("--timeout", type=float, default=120, help="скільки чекати завершення завантажень, с")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    work = tempfile.mkdtemp(prefix="dowlander_load_")
+    media_root = os.path.join(work, "media")
+    os.makedirs(media_root)
+    clip = make_clip(os.path.join(media_root, "clip_0.mp4"), seconds=args.clip_seconds)
+    for n in range(1, args.distinct_urls):
+        shutil.copyfile(clip, os.path.join(media_root, f"clip_{n}.mp4"))
+
+    api = FakeBotAPI(
+        latency=args.api_latency, upload_bps=args.upload_bps,
+        rate_429=args.rate_429, size_limit=int(args.size_limit * 1024 * 1024), rate_5xx=args.rate_5xx
+    )
+    media = MediaServer(media_root, latency=args.media_latency)
+
+    # Бот працює в окремому процесі, щоб генератор і фейки не ділили з ним GIL
+    port = free_port()
+    env = dict(os.environ, TOKEN=TOKEN, BOT_API_URL=api.url, DATA_DIR=os.path.join(work, "data"),
+               PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    env.pop("WEBHOOK_SECRET", None)
+    if args.tg_rate:
+        env["TG_GLOBAL_RATE"] = str(args.tg_rate)
+    env["WORKER_PROCESSES"] = str(args.worker_processes)
+    bot = subprocess.Popen([sys.executable, "-c", BOT_SERVER, str(port)], cwd=work, env=env)
+    base = f"http://127.0.0.1:{port}"
+    webhook = f"{base}/{TOKEN}"
+    wait_ready(base, bot)
+
+    # План навантаження: який апдейт — посилання, а який — звичайний текст
+    rnd = random.Random(42)
+    urls = itertools.cycle(f"{media.url}/clip_{n}.mp4" for n in range(args.distinct_urls))
+    plan = []
+    for i in range(args.updates):
+        is_url = rnd.random() < args.url_share
+        plan.append((i, next(urls) if is_url else rnd.choice(TEXTS), is_url))
+
+    sent_at = {}
+    rejected = []
+    local = threading.local()
+
+    def post(item):
+        i, text, _ = item
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        body = json.dumps(make_update(i, text))
+        sent_at[i] = time.perf_counter()
+        r = session.post(webhook, data=body, headers={"Content-Type": "application/json"})
+        if r.status_code != 200:
+            rejected.append((i, r.status_code))
+        return time.perf_counter()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        finished = list(pool.map(post, plan))
+    accepted_in = max(finished) - started
+
+    # Чекаємо, поки кожен чат отримає відповідь, а завантаження — медіа
+    url_chats = {CHAT_BASE + i for i, _, is_url in plan if is_url}
+    all_chats = {CHAT_BASE + i for i, _, _ in plan} - {CHAT_BASE + i for i, _ in rejected}
+    deadline = time.perf_counter() + args.timeout
+    checked = 0
+    while time.perf_counter() < deadline:
+        with api.lock:
+            replied = {c[2] for c in api.calls}
+            delivered = {c[2] for c in api.calls if c[1] in MEDIA_METHODS and c[4] == 200}
+        if all_chats <= replied and (url_chats - {CHAT_BASE + i for i, _ in rejected}) <= delivered:
+            break
+        # Частину посилань бот міг відхилити (квоти, перевантаження) — тоді чекаємо, поки черга спорожніє
+        if all_chats <= replied and time.perf_counter() - checked > 1:
+            checked = time.perf_counter()
+            if idle(base):
+                break
+        time.sleep(0.05)
+    # Дочекатись хвостів (аудіо після відео тощо), поки Bot API не затихне
+    while True:
+        with api.lock:
+            last = api.calls[-1][0] if api.calls else 0
+        if time.perf_counter() - last > 1.0 or time.perf_counter() > deadline:
+            break
+        time.sleep(0.2)
+
+    first_reply, job_done = {}, {}
+    with api.lock:
+        calls = list(api.calls)
+    for t, method, chat, size, status in calls:
+        if chat not in all_chats:
+            continue
+        first_reply.setdefault(chat, t)
+        if method in MEDIA_METHODS and status == 200:
+            job_done[chat] = t
+
+    ttfb_text, ttfb_url, e2e = [], [], []
+    for i, _, is_url in plan:
+        chat = CHAT_BASE + i
+        if chat in first_reply:
+            (ttfb_url if is_url else ttfb_text).append(first_reply[chat] - sent_at[i])
+        if is_url and chat in job_done:
+            e2e.append(job_done[chat] - sent_at[i])
+    handled_in = (max(first_reply.values()) - started) if first_reply else float("nan")
+
+    by_method, by_status = {}, {}
+    for _, method, _, _, status in calls:
+        by_method[method] = by_method.get(method, 0) + 1
+        by_status[status] = by_status.get(status, 0) + 1
+
+    stats = scrape(base)
+
+    def ms(values, p):
+        return f"{percentile(values, p) * 1000:9.1f}"
+
+    print()
+    print(f"updates: {args.updates} (urls: {len(url_chats)}, distinct videos: {args.distinct_urls}), "
+          f"concurrency: {args.concurrency}, api latency: {args.api_latency * 1000:.0f} ms, 429 rate: {args.rate_429}")
+    print(f"webhook accepted:   {args.updates / accepted_in:9.1f} updates/s  ({len(rejected)} rejected)")
+    print(f"first replies sent: {len(first_reply) / handled_in:9.1f} updates/s  "
+          f"({len(first_reply)}/{len(all_chats)} chats answered)")
+    print()
+    print(f"{'latency, ms':<26}{'p50':>9} {'p99':>9} {'max':>9}")
+    for name, values in (("first reply (text)", ttfb_text), ("first reply (url)", ttfb_url),
+                         ("end-to-end job", e2e)):
+        if values:
+            print(f"{name:<26}{ms(values, 50)} {ms(values, 99)} {ms(values, 100)}")
+    print(f"jobs delivered: {len(e2e)}/{len(url_chats)}, media requests served: {media.requests}")
+    throttled = sum(v for k, v in stats.items() if k.startswith("dowlander_telegram_throttled_total"))
+
+    print()
+    print("Bot API calls:", ", ".join(f"{m}={n}" for m, n in sorted(by_method.items())))
+    print("Bot API status:", ", ".join(f"{s}={n}" for s, n in sorted(by_status.items())),
+          f"| bot retried 429s: {int(throttled)}")
+    lookups = {k: int(v) for k, v in stats.items() if k.startswith("dowlander_cache_lookups_total")}
+    print("bot cache lookups:", ", ".join(f"{k[k.index('{'):]}={v}" for k, v in sorted(lookups.items())))
+    admitted = {k: int(v) for k, v in stats.items() if k.startswith("dowlander_admission_total")}
+    print("bot admission:", ", ".join(f"{k[k.index('{'):]}={v}" for k, v in sorted(admitted.items())))
+    retried = {k: int(v) for k, v in stats.items() if k.startswith("dowlander_telegram_retries_total")}
+    print("bot transport retries:", ", ".join(f"{k[k.index('{'):]}={v}" for k, v in sorted(retried.items())) or "0")
+
+    # Затримка Bot API очима бота (з гістограми транспорту), середнє по методу
+    print()
+    print(f"{'bot-side API latency, ms':<26}{'mean':>9} {'calls':>9}")
+    prefix = "dowlander_telegram_request_seconds"
+    for key in sorted(k for k in stats if k.startswith(prefix + "_count")):
+        labels = key[len(prefix + "_count"):]
+        count = stats[key]
+        if count:
+            method = labels.split('"')[1]
+            print(f"{method:<26}{stats[prefix + '_sum' + labels] / count * 1000:9.1f} {int(count):9d}")
+
+    # SIGINT, а не SIGTERM: веб-процес має встигнути зупинити своїх воркерів
+    bot.send_signal(signal.SIGINT)
+    bot.wait(10)
+    api.stop()
+    media.stop()
+    shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
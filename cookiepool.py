@@ -0,0 +1,225 @@
+import glob
+import io
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from metrics import registry as metrics
+
+# ============================================================
+#          ПУЛ COOKIES І USER-AGENT ДЛЯ ЕКСТРАКТОРІВ
+# ============================================================
+# Джерела — cookies.txt і файли *.txt з каталогу cookies/ (формат Netscape).
+# Кожен файл — окремий "jar"; платформи визначаються за доменами cookies.
+# Запити до платформи по черзі отримують її jar і прив'язаний до нього
+# User-Agent. Jar, на який платформа відповіла вимогою логіну чи 429,
+# відпочиває (щоразу довше), а запит іде з наступним. Файли
+# перечитуються, щойно змінились на диску, — без перезапуску бота.
+# yt-dlp отримує копію jar у пам'яті: файли на диску він не перезаписує.
+
+PLATFORM_DOMAINS = {
+    "youtube": ("youtube.com", "youtu.be", "google.com"),
+    "instagram": ("instagram.com", "instagr.am"),
+    "tiktok": ("tiktok.com",),
+    "facebook": ("facebook.com", "fb.watch"),
+    "twitter": ("twitter.com", "x.com"),
+    "pinterest": ("pinterest.com", "pin.it"),
+}
+
+USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/130.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/130.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:132.0) Gecko/20100101 Firefox/132.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+    "Version/18.0 Safari/605.1.15",
+)
+
+# Відмови, після яких варто взяти інші cookies: логін, перевірка на бота, 401/403/429
+REFUSAL_RE = re.compile(
+    r"sign in|log ?in|login required|--cookies|not a bot|rate.?limit|too many requests|HTTP Error (401|403|429)",
+    re.IGNORECASE
+)
+
+LEASES = metrics.counter(
+    "dowlander_cookie_leases_total", "Extractions by platform and cookie source", ["platform", "source"]
+)
+BENCHED = metrics.counter(
+    "dowlander_cookie_benched_total", "Cookie jars benched after a refusal", ["platform"]
+)
+
+
+def platform_of(url):
+    host = (urlsplit(url).hostname or "").lower()
+    for platform, domains in PLATFORM_DOMAINS.items():
+        if any(host == d or host.endswith("." + d) for d in domains):
+            return platform
+    if host.replace(".", "").isdigit():
+        return host
+    return ".".join(host.split(".")[-2:]) or "generic"
+
+
+def _label(platform):
+    # Мітка метрики: відомі платформи окремо, решта доменів — разом
+    return platform if platform in PLATFORM_DOMAINS else "other"
+
+
+class Jar:
+    def __init__(self, path, text, platforms, user_agent):
+        self.path = path
+        self.text = text
+        self.platforms = platforms
+        self.user_agent = user_agent
+        self.failures = 0
+        self.benched_until = 0
+
+
+class Lease:
+    def __init__(self, platform, jar, user_agent):
+        self.platform = platform
+        self.jar = jar
+        self.user_agent = user_agent
+
+    def cookiefile(self):
+        # Свіжа копія на кожен YoutubeDL: він зберігає cookies при закритті
+        return io.StringIO(self.jar.text) if self.jar else None
+
+
+class CookiePool:
+    def __init__(self, files=(), directory=None, bench_seconds=600, bench_max=6 * 3600, reload_interval=30,
+                 user_agents=USER_AGENTS):
+        self.files = [f for f in files if f]
+        self.directory = directory
+        self.bench_seconds = bench_seconds
+        self.bench_max = bench_max
+        self.reload_interval = reload_interval
+        self.user_agents = user_agents
+        self.lock = threading.Lock()
+        self.jars = []
+        self.signature = None
+        self.checked = 0
+        self.turns = {}                       # платформа -> лічильник черги
+        self.anonymous = itertools.count()
+        self.reload()
+
+    def lease(self, url):
+        self._maybe_reload()
+        platform = platform_of(url)
+        now = time.time()
+        with self.lock:
+            ready = [j for j in self.jars if platform in j.platforms and j.benched_until <= now]
+            if ready:
+                turn = self.turns.setdefault(platform, itertools.count())
+                jar = ready[next(turn) % len(ready)]
+                lease = Lease(platform, jar, jar.user_agent)
+            else:
+                lease = Lease(platform, None, self.user_agents[next(self.anonymous) % len(self.user_agents)])
+        LEASES.inc(platform=_label(platform), source="jar" if lease.jar else "anonymous")
+        return lease
+
+    def report(self, lease, error=None):
+        """Результат спроби. True — платформа відмовила саме цим cookies, варто спробувати інші."""
+        jar = lease.jar
+        if jar is None:
+            return False
+        refused = error is not None and bool(REFUSAL_RE.search(str(error)))
+        with self.lock:
+            if not refused:
+                if error is None:
+                    jar.failures = 0
+                return False
+            jar.failures += 1
+            pause = min(self.bench_max, self.bench_seconds * 2 ** (jar.failures - 1))
+            jar.benched_until = time.time() + pause
+        BENCHED.inc(platform=_label(lease.platform))
+        logging.warning(f"Cookie jar {jar.path} benched for {pause}s on {lease.platform}: {error}")
+        return True
+
+    def stats(self):
+        now = time.time()
+        with self.lock:
+            return {"jars": len(self.jars), "benched": sum(1 for j in self.jars if j.benched_until > now)}
+
+    # ---------------- Читання з диска ----------------
+
+    def reload(self, force=False):
+        paths = self._paths()
+        signature = tuple((p, _mtime(p)) for p in paths)
+        if not force and signature == self.signature:
+            return False
+        old = {j.path: j for j in self.jars}
+        jars = []
+        for i, path in enumerate(paths):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    text = f.read()
+            except OSError as e:
+                logging.error(f"Cookie file {path} unreadable: {e}")
+                continue
+            platforms, user_agent = _parse(text)
+            if not platforms:
+                logging.warning(f"Cookie file {path} has no live cookies, skipped")
+                continue
+            jar = Jar(path, text, platforms, user_agent or self.user_agents[i % len(self.user_agents)])
+            if path in old:
+                # Перечитаний файл зберігає свій стан (на відпочинку чи ні)
+                jar.failures = old[path].failures
+                jar.benched_until = old[path].benched_until
+            jars.append(jar)
+        with self.lock:
+            self.jars = jars
+            self.signature = signature
+        logging.info(f"Cookie pool: {len(jars)} jars for {sorted({p for j in jars for p in j.platforms})}")
+        return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self.checked < self.reload_interval:
+            return
+        self.checked = now
+        try:
+            self.reload()
+        except Exception as e:
+            logging.error(f"COOKIE RELOAD ERROR: {e}")
+
+    def _paths(self):
+        paths = [f for f in self.files if os.path.isfile(f)]
+        if self.directory and os.path.isdir(self.directory):
+            paths += sorted(glob.glob(os.path.join(self.directory, "*.txt")))
+        return paths
+
+
+def _parse(text):
+    """Платформи з живими cookies і необов'язковий рядок "# User-Agent: ..." з файлу."""
+    now = time.time()
+    platforms = set()
+    user_agent = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.lower().startswith("# user-agent:"):
+            user_agent = line.split(":", 1)[1].strip()
+            continue
+        if line.startswith("#HttpOnly_"):
+            line = line[len("#HttpOnly_"):]
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split("\t")
+        if len(fields) < 7:
+            continue
+        expires = fields[4]
+        if expires.isdigit() and 0 < int(expires) < now:
+            continue
+        platforms.add(platform_of("https://" + fields[0].lstrip(".")))
+    return platforms, user_agent
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
@@ -0,0 +1,71 @@
+import logging
+import queue
+import threading
+from collections import OrderedDict
+
+# ============================================================
+#         ДИСПЕТЧЕР ОНОВЛЕНЬ (webhook відповідає одразу)
+# ============================================================
+# Webhook лише кладе оновлення в чергу і повертає 200.
+# Оновлення одного чату завжди потрапляють в одну чергу (той самий потік),
+# тому порядок у межах чату зберігається. Повтори за update_id відкидаються.
+
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+BUSY = "busy"
+
+
+def chat_key(update):
+    for obj in (update.message, update.edited_message, update.channel_post, update.edited_channel_post):
+        if obj is not None:
+            return obj.chat.id
+    cq = update.callback_query
+    if cq is not None:
+        if cq.message is not None:
+            return cq.message.chat.id
+        return cq.from_user.id
+    for obj in (update.inline_query, update.chosen_inline_result, update.my_chat_member, update.chat_member):
+        if obj is not None and getattr(obj, "from_user", None) is not None:
+            return obj.from_user.id
+    return update.update_id
+
+
+class UpdateDispatcher:
+    def __init__(self, process, workers=4, queue_size=1000, dedup_size=10000):
+        self.process = process
+        self.dedup_size = dedup_size
+        self.queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(max(1, workers))]
+        self.lock = threading.Lock()
+        self.seen = OrderedDict()
+
+    def start(self):
+        for i, q in enumerate(self.queues):
+            threading.Thread(target=self._worker, args=(q,), name=f"dispatch-{i}", daemon=True).start()
+
+    def submit(self, update):
+        with self.lock:
+            if update.update_id in self.seen:
+                return DUPLICATE
+            q = self.queues[hash(chat_key(update)) % len(self.queues)]
+            try:
+                q.put_nowait(update)
+            except queue.Full:
+                # Не запам'ятовуємо id: Telegram повторить доставку пізніше
+                return BUSY
+            self.seen[update.update_id] = None
+            if len(self.seen) > self.dedup_size:
+                self.seen.popitem(last=False)
+        return ACCEPTED
+
+    def depth(self):
+        return sum(q.qsize() for q in self.queues)
+
+    def _worker(self, q):
+        while True:
+            update = q.get()
+            try:
+                self.process([update])
+            except Exception as e:
+                logging.error(f"DISPATCH ERROR: {e}")
+            finally:
+                q.task_done()
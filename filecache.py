@@ -0,0 +1,80 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+# ============================================================
+#              КЕШ TELEGRAM file_id (SQLite)
+# ============================================================
+# Ключ: (екстрактор, id відео, формат, video_plus_audio).
+# Значення: file_id, які Telegram повернув після send_video/send_audio.
+# Витіснення: TTL + LRU (за часом останнього використання).
+
+
+def make_key(extractor, video_id, fmt, video_plus_audio):
+    return f"{extractor}:{video_id}:{fmt}:{int(bool(video_plus_audio))}"
+
+
+class FileIdCache:
+    def __init__(self, path, max_entries=5000, ttl=30 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.puts = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        # WAL: кеш читають і пишуть кілька процесів (веб + воркери)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "key TEXT PRIMARY KEY, data TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_used ON files(used)")
+        self.conn.commit()
+        self._evict()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT data, created FROM files WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            data, created = row
+            if now - created > self.ttl:
+                self.conn.execute("DELETE FROM files WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE files SET used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+        return json.loads(data)
+
+    def put(self, key, data):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (key, data, created, used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(data, ensure_ascii=False), now, now)
+            )
+            self.conn.commit()
+            self.puts += 1
+            need_evict = self.puts % 100 == 0
+        if need_evict:
+            self._evict()
+
+    def delete(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM files WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def _evict(self):
+        try:
+            with self.lock:
+                self.conn.execute("DELETE FROM files WHERE created < ?", (time.time() - self.ttl,))
+                self.conn.execute(
+                    "DELETE FROM files WHERE key IN ("
+                    "SELECT key FROM files ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                self.conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"FILE CACHE EVICT ERROR: {e}")
@@ -0,0 +1,259 @@
+import atexit
+import json
+import logging
+import os
+import socket
+import sqlite3
+import subprocess
+import threading
+import time
+
+from workers import ACCEPTED, QUEUE_FULL, CHAT_LIMIT, DEFAULT_PRIORITY
+
+# ============================================================
+#        ЧЕРГА ЗАВАНТАЖЕНЬ МІЖ ПРОЦЕСАМИ (SQLite, WAL)
+# ============================================================
+# Веб-процес лише кладе задачі в таблицю, процеси-воркери забирають їх
+# по одній (за пріоритетом, потім за часом), пропускаючи чати, що вже
+# виконують per_chat задач одночасно. Воркер періодично оновлює
+# heartbeat; задачу процесу, що впав, повертає в чергу будь-який інший
+# воркер. Інтерфейс submit/stats такий самий, як у DownloadPool.
+
+PENDING = "pending"
+RUNNING = "running"
+
+# Колонки, додані пізніше: старі бази доповнюються при старті
+ADDED_COLUMNS = {"priority": f"INTEGER DEFAULT {DEFAULT_PRIORITY}"}
+
+
+class JobQueue:
+    def __init__(self, path, capacity=3, queue_size=50, per_chat=2, stale_after=120, max_attempts=3):
+        self.capacity = max(1, capacity)       # скільки задач воркери виконують одночасно
+        self.queue_size = max(1, queue_size)
+        self.per_chat = max(1, per_chat)
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER NOT NULL, payload TEXT NOT NULL, "
+            "state TEXT NOT NULL, worker TEXT, attempts INTEGER DEFAULT 0, created REAL, heartbeat REAL, "
+            f"priority INTEGER DEFAULT {DEFAULT_PRIORITY})"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        for name, decl in ADDED_COLUMNS.items():
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+        self.conn.execute("DROP INDEX IF EXISTS jobs_state")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_pending ON jobs(state, priority, id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_chat ON jobs(chat_id)")
+
+    def submit(self, chat_id, payload, priority=DEFAULT_PRIORITY):
+        """Повертає (статус, позиція в черзі), як DownloadPool.submit."""
+        return self.submit_many(chat_id, [payload], priority)
+
+    def submit_many(self, chat_id, payloads, priority=DEFAULT_PRIORITY):
+        """Усі задачі повідомлення разом або жодної, як DownloadPool.submit_many."""
+        now = time.time()
+        with self.lock, self._tx():
+            if self._count("chat_id = ?", chat_id) >= self.per_chat:
+                return CHAT_LIMIT, None
+            pending = self._count("state = ?", PENDING)
+            if pending + len(payloads) > self.queue_size:
+                return QUEUE_FULL, None
+            ahead = self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = ? AND priority <= ?", (PENDING, priority)
+            ).fetchone()[0]
+            running = self._count("state = ?", RUNNING)
+            self.conn.executemany(
+                "INSERT INTO jobs (chat_id, payload, state, created, priority) VALUES (?, ?, ?, ?, ?)",
+                [(chat_id, json.dumps(p, ensure_ascii=False), PENDING, now, priority) for p in payloads]
+            )
+        return ACCEPTED, max(0, ahead + 1 - max(0, self.capacity - running))
+
+    def claim(self, worker):
+        """Найстаріша задача в черзі, чий чат не вичерпав per_chat активних задач, або None."""
+        # Порожня черга — звичайне читання, без блокування запису в базі
+        with self.lock:
+            if not self.conn.execute("SELECT 1 FROM jobs WHERE state = ? LIMIT 1", (PENDING,)).fetchone():
+                return None
+        now = time.time()
+        with self.lock, self._tx():
+            row = self.conn.execute(
+                "SELECT id, payload FROM jobs WHERE state = ? AND chat_id NOT IN ("
+                "SELECT chat_id FROM jobs WHERE state = ? GROUP BY chat_id HAVING COUNT(*) >= ?) "
+                "ORDER BY priority, id LIMIT 1",
+                (PENDING, RUNNING, self.per_chat)
+            ).fetchone()
+            if not row:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, worker = ?, attempts = attempts + 1, heartbeat = ? WHERE id = ?",
+                (RUNNING, worker, now, row[0])
+            )
+        return row[0], json.loads(row[1])
+
+    def heartbeat(self, job_ids):
+        if not job_ids:
+            return
+        with self.lock, self._tx():
+            self.conn.executemany(
+                "UPDATE jobs SET heartbeat = ? WHERE id = ?", [(time.time(), i) for i in job_ids]
+            )
+
+    def finish(self, job_id):
+        with self.lock, self._tx():
+            self.conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def requeue_stale(self):
+        """Задачі воркерів, що перестали слати heartbeat, — знову в чергу.
+
+        Повертає [(chat_id, payload)] задач, що вичерпали спроби і видалені.
+        """
+        deadline = time.time() - self.stale_after
+        stale = "state = ? AND heartbeat < ? AND attempts >= ?"
+        with self.lock, self._tx():
+            rows = self.conn.execute(
+                f"SELECT chat_id, payload FROM jobs WHERE {stale}", (RUNNING, deadline, self.max_attempts)
+            ).fetchall()
+            if rows:
+                self.conn.execute(f"DELETE FROM jobs WHERE {stale}", (RUNNING, deadline, self.max_attempts))
+            requeued = self.conn.execute(
+                "UPDATE jobs SET state = ?, worker = NULL WHERE state = ? AND heartbeat < ?",
+                (PENDING, RUNNING, deadline)
+            ).rowcount
+        if rows:
+            logging.error(f"Dropped {len(rows)} jobs after {self.max_attempts} failed attempts")
+        if requeued:
+            logging.warning(f"Requeued {requeued} jobs from stalled workers")
+        return [(chat_id, json.loads(payload)) for chat_id, payload in rows]
+
+    def stats(self):
+        with self.lock:
+            rows = dict(self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return {"pending": rows.get(PENDING, 0), "running": rows.get(RUNNING, 0), "workers": self.capacity}
+
+    def _count(self, where, arg):
+        return self.conn.execute(f"SELECT COUNT(*) FROM jobs WHERE {where}", (arg,)).fetchone()[0]
+
+    def _tx(self):
+        return _Transaction(self.conn)
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE: запис блокується одразу, тож два процеси не заберуть одну задачу
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+# ============================================================
+#                   ПРОЦЕС-ВОРКЕР
+# ============================================================
+
+class QueueWorker:
+    def __init__(self, queue, handler, threads=3, poll_interval=0.3, on_dropped=None):
+        self.queue = queue
+        self.handler = handler
+        self.on_dropped = on_dropped    # (chat_id, payload) задачі, що вичерпала спроби
+        self.threads = max(1, threads)
+        self.poll_interval = poll_interval
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.running = set()
+
+    def start(self):
+        for i in range(self.threads):
+            threading.Thread(target=self._loop, name=f"download-{i}", daemon=True).start()
+        threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            try:
+                job = self.queue.claim(self.name)
+            except sqlite3.Error as e:
+                logging.error(f"JOB CLAIM ERROR: {e}")
+                job = None
+            if job is None:
+                time.sleep(self.poll_interval)
+                continue
+            job_id, payload = job
+            with self.lock:
+                self.running.add(job_id)
+            try:
+                self.handler(payload)
+            except Exception as e:
+                logging.error(f"WORKER ERROR: {e}")
+            finally:
+                with self.lock:
+                    self.running.discard(job_id)
+                try:
+                    self.queue.finish(job_id)
+                except sqlite3.Error as e:
+                    logging.error(f"JOB FINISH ERROR: {e}")
+
+    def _heartbeat(self):
+        interval = max(1, self.queue.stale_after / 4)
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                ids = list(self.running)
+            try:
+                self.queue.heartbeat(ids)
+                dropped = self.queue.requeue_stale()
+            except sqlite3.Error as e:
+                logging.error(f"JOB HEARTBEAT ERROR: {e}")
+                continue
+            for chat_id, payload in dropped:
+                if self.on_dropped:
+                    try:
+                        self.on_dropped(chat_id, payload)
+                    except Exception as e:
+                        logging.error(f"JOB DROP ERROR: {e}")
+
+
+# ============================================================
+#            ЗАПУСК І ПЕРЕЗАПУСК ПРОЦЕСІВ-ВОРКЕРІВ
+# ============================================================
+
+class WorkerProcesses:
+    def __init__(self, cmd, count):
+        self.cmd = cmd
+        self.count = count
+        self.procs = []
+        self.stopped = False
+
+    def start(self):
+        for i in range(self.count):
+            threading.Thread(target=self._supervise, args=(i,), name=f"worker-proc-{i}", daemon=True).start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self.stopped = True
+        for p in list(self.procs):
+            if p.poll() is None:
+                p.terminate()
+
+    def _supervise(self, i):
+        backoff = 1
+        while not self.stopped:
+            started = time.monotonic()
+            proc = subprocess.Popen(self.cmd)
+            self.procs.append(proc)
+            logging.info(f"Worker process {i} started (pid {proc.pid})")
+            code = proc.wait()
+            self.procs.remove(proc)
+            if self.stopped:
+                return
+            # Процес, що падає одразу після старту, перезапускаємо все рідше
+            backoff = 1 if time.monotonic() - started > 60 else min(backoff * 2, 60)
+            logging.error(f"Worker process {i} exited with code {code}, restarting in {backoff}s")
+            time.sleep(backoff)
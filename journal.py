@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# ============================================================
+#          ЖУРНАЛ ЗАДАЧ (переживає перезапуск процесу)
+# ============================================================
+# Кожна задача записується до того, як потрапить у пул, і проходить стани
+# queued -> downloading -> postprocessing -> uploading -> done. Разом зі
+# станом зберігається каталог спулу: після перезапуску задача продовжує
+# в ньому ж, і yt-dlp докачує .part файли Range-запитами, а не з нуля.
+
+QUEUED = "queued"
+DOWNLOADING = "downloading"
+POSTPROCESSING = "postprocessing"
+UPLOADING = "uploading"
+DONE = "done"
+
+
+class JobJournal:
+    def __init__(self, path, max_attempts=3):
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER NOT NULL, payload TEXT NOT NULL, "
+            "state TEXT NOT NULL, spool TEXT, message_id INTEGER, pid INTEGER, attempts INTEGER DEFAULT 0, "
+            "created REAL, updated REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS journal_state ON journal(state, id)")
+
+    def add_many(self, chat_id, payloads):
+        """Записує задачі в стані queued, повертає їхні id."""
+        now = time.time()
+        ids = []
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for p in payloads:
+                    cur = self.conn.execute(
+                        "INSERT INTO journal (chat_id, payload, state, created, updated) VALUES (?, ?, ?, ?, ?)",
+                        (chat_id, json.dumps(p, ensure_ascii=False), QUEUED, now, now)
+                    )
+                    ids.append(cur.lastrowid)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return ids
+
+    def start(self, job_id):
+        """Задачу взяв воркер цього процесу. Повертає запис до оновлення (або None)."""
+        row = self.get(job_id)
+        if row:
+            self._execute(
+                "UPDATE journal SET pid = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                (os.getpid(), time.time(), job_id)
+            )
+        return row
+
+    def set_state(self, job_id, state, spool=None):
+        if spool:
+            self._execute(
+                "UPDATE journal SET state = ?, spool = ?, updated = ? WHERE id = ?",
+                (state, spool, time.time(), job_id)
+            )
+        else:
+            self._execute("UPDATE journal SET state = ?, updated = ? WHERE id = ?", (state, time.time(), job_id))
+
+    def set_message(self, job_id, message_id):
+        # Статус-повідомлення, яке треба прибрати, якщо задачу перервано
+        self._execute("UPDATE journal SET message_id = ? WHERE id = ?", (message_id, job_id))
+
+    def finish(self, job_id):
+        self.set_state(job_id, DONE)
+
+    def discard(self, job_ids):
+        # Пул не прийняв задачі — запису не має лишитись
+        with self.lock:
+            self.conn.executemany("DELETE FROM journal WHERE id = ?", [(i,) for i in job_ids])
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, chat_id, payload, state, spool, message_id, pid, attempts FROM journal WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        return _row(row) if row else None
+
+    def unfinished(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, chat_id, payload, state, spool, message_id, pid, attempts FROM journal "
+                "WHERE state != ? ORDER BY id", (DONE,)
+            ).fetchall()
+        return [_row(r) for r in rows]
+
+    def spool_dirs(self):
+        """Каталоги спулу незавершених задач — прибиральник їх не чіпає."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT spool FROM journal WHERE state != ? AND spool IS NOT NULL", (DONE,)
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def purge(self, max_age):
+        """Видаляє завершені записи і ті, що висять довше за max_age."""
+        with self.lock:
+            n = self.conn.execute(
+                "DELETE FROM journal WHERE state = ? OR created < ?", (DONE, time.time() - max_age)
+            ).rowcount
+        return n
+
+    def _execute(self, sql, args):
+        try:
+            with self.lock:
+                self.conn.execute(sql, args)
+        except sqlite3.Error as e:
+            # Журнал не має зупиняти саме завантаження
+            logging.error(f"JOURNAL ERROR: {e}")
+
+
+def _row(row):
+    return {
+        "id": row[0], "chat_id": row[1], "payload": json.loads(row[2]), "state": row[3],
+        "spool": row[4], "message_id": row[5], "pid": row[6], "attempts": row[7]
+    }
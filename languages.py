@@ -17,11 +17,21 @@ texts = {
         "enter_url": "📎 Надішли посилання!",
         "not_understood": "😅 Не розумію, обери кнопку.",
         "loading": "⏳ Завантаження…",
+        "stage_download": "Завантаження",
+        "stage_merge": "Об'єднання відео і звуку",
+        "stage_audio": "Обробка аудіо",
+        "stage_upload": "Відправка",
         "saved": "✔ Збережено!",
+        "queued": "🕒 Посилання в черзі. Перед тобою: {pos}",
+        "queue_full": "🚦 Бот перевантажений, спробуй за хвилину.",
+        "chat_limit": "⏳ Зачекай, поки завершаться попередні завантаження.",
+        "rate_limited": "⏳ Забагато запитів. Спробуй через {seconds} с.",
+        "daily_quota": "📦 Денний ліміт {limit} МБ для тарифу «{tier}» вичерпано. Спробуй пізніше.",
 
         "unsupported": "❌ Ця платформа поки не підтримується.",
         "yt_disabled": "⛔ Завантаження з YouTube тимчасово недоступне.",
         "download_failed": "❌ Не вдалося скачати медіа. Спробуй інше посилання.",
+        "too_large": "❌ Файл завеликий для Telegram (ліміт {limit} МБ).",
         "tiktok_error": "❌ Не вдалося завантажити з TikTok.",
         "ig_error": "❌ Не вдалося завантажити з Instagram.",
         "audio_extract_error": "❌ Не вдалося витягнути аудіо.",
@@ -32,12 +42,15 @@ texts = {
         "lbl_downloaded": "Завантажено",
         "lbl_format": "Формат",
         "lbl_video_plus_audio": "Відео + Аудіо",
+        "lbl_albums": "Альбоми і плейлисти",
+        "btn_audio": "🎵 Аудіо",
+        "audio_failed": "❌ Не вдалося отримати аудіо. Надішли посилання ще раз.",
         "lbl_since": "З",
         "yes": "Так",
         "no": "Ні",
 
         "free_version": "💎 Безкоштовна версія.",
-        "subscription_names": {"free": "Безкоштовна 💎"},
+        "subscription_names": {"free": "Безкоштовна 💎", "premium": "Преміум ⭐"},
 
         "settings_title": "⚙️ Налаштування:",
         "profile_title": "👤 Профіль",
@@ -64,11 +77,21 @@ texts = {
         "enter_url": "📎 Send a link!",
         "not_understood": "😅 I don't understand, use the buttons.",
         "loading": "⏳ Downloading…",
+        "stage_download": "Downloading",
+        "stage_merge": "Merging video and audio",
+        "stage_audio": "Processing audio",
+        "stage_upload": "Uploading",
         "saved": "✔ Saved!",
+        "queued": "🕒 Link queued. Ahead of you: {pos}",
+        "queue_full": "🚦 The bot is overloaded, try again in a minute.",
+        "chat_limit": "⏳ Please wait until your previous downloads finish.",
+        "rate_limited": "⏳ Too many requests. Try again in {seconds} s.",
+        "daily_quota": "📦 The daily limit of {limit} MB for the {tier} plan is used up. Try again later.",
 
         "unsupported": "❌ This platform is not supported yet.",
         "yt_disabled": "⛔ Downloading from YouTube is temporarily unavailable.",
         "download_failed": "❌ Failed to download media. Try another link.",
+        "too_large": "❌ The file is too large for Telegram (limit {limit} MB).",
         "tiktok_error": "❌ Failed to download from TikTok.",
         "ig_error": "❌ Failed to download from Instagram.",
         "audio_extract_error": "❌ Failed to extract audio.",
@@ -79,12 +102,15 @@ texts = {
         "lbl_downloaded": "Downloaded",
         "lbl_format": "Format",
         "lbl_video_plus_audio": "Video + Audio",
+        "lbl_albums": "Albums and playlists",
+        "btn_audio": "🎵 Audio",
+        "audio_failed": "❌ Couldn't get the audio. Send the link again.",
         "lbl_since": "Since",
         "yes": "Yes",
         "no": "No",
 
         "free_version": "💎 Free version.",
-        "subscription_names": {"free": "Free 💎"},
+        "subscription_names": {"free": "Free 💎", "premium": "Premium ⭐"},
 
         "settings_title": "⚙️ Settings:",
         "profile_title": "👤 Profile",
@@ -112,11 +138,21 @@ texts = {
         "enter_url": "📎 Пришли ссылку!",
         "not_understood": "😅 Не понимаю, выбери кнопку.",
         "loading": "⏳ Загрузка…",
+        "stage_download": "Загрузка",
+        "stage_merge": "Объединение видео и звука",
+        "stage_audio": "Обработка аудио",
+        "stage_upload": "Отправка",
         "saved": "✔ Сохранено!",
+        "queued": "🕒 Ссылка в очереди. Перед тобой: {pos}",
+        "queue_full": "🚦 Бот перегружен, попробуй через минуту.",
+        "chat_limit": "⏳ Подожди, пока завершатся предыдущие загрузки.",
+        "rate_limited": "⏳ Слишком много запросов. Попробуй через {seconds} с.",
+        "daily_quota": "📦 Дневной лимит {limit} МБ для тарифа «{tier}» исчерпан. Попробуй позже.",
 
         "unsupported": "❌ Эта платформа пока не поддерживается.",
         "yt_disabled": "⛔ Загрузка с YouTube временно недоступна.",
         "download_failed": "❌ Не удалось скачать медиа.",
+        "too_large": "❌ Файл слишком большой для Telegram (лимит {limit} МБ).",
         "tiktok_error": "❌ Не удалось скачать из TikTok.",
         "ig_error": "❌ Не удалось скачать из Instagram.",
         "audio_extract_error": "❌ Не удалось извлечь аудио.",
@@ -127,12 +163,15 @@ texts = {
         "lbl_downloaded": "Скачано",
         "lbl_format": "Формат",
         "lbl_video_plus_audio": "Видео + Аудио",
+        "lbl_albums": "Альбомы и плейлисты",
+        "btn_audio": "🎵 Аудио",
+        "audio_failed": "❌ Не удалось получить аудио. Отправь ссылку ещё раз.",
         "lbl_since": "С",
         "yes": "Да",
         "no": "Нет",
 
         "free_version": "💎 Бесплатная версия.",
-        "subscription_names": {"free": "Бесплатная 💎"},
+        "subscription_names": {"free": "Бесплатная 💎", "premium": "Премиум ⭐"},
 
         "settings_title": "⚙️ Настройки:",
         "profile_title": "👤 Профиль",
@@ -159,11 +198,21 @@ texts = {
         "enter_url": "📎 Envoie un lien !",
         "not_understood": "😅 Je ne comprends pas, utilise les boutons.",
         "loading": "⏳ Téléchargement…",
+        "stage_download": "Téléchargement",
+        "stage_merge": "Fusion vidéo et audio",
+        "stage_audio": "Traitement audio",
+        "stage_upload": "Envoi",
         "saved": "✔ Enregistré !",
+        "queued": "🕒 Lien en file d'attente. Devant toi : {pos}",
+        "queue_full": "🚦 Le bot est surchargé, réessaie dans une minute.",
+        "chat_limit": "⏳ Attends la fin de tes téléchargements précédents.",
+        "rate_limited": "⏳ Trop de demandes. Réessaie dans {seconds} s.",
+        "daily_quota": "📦 La limite quotidienne de {limit} Mo de l'offre « {tier} » est atteinte. Réessaie plus tard.",
 
         "unsupported": "❌ Cette plateforme n'est pas encore prise en charge.",
         "yt_disabled": "⛔ Le téléchargement depuis YouTube est temporairement indisponible.",
         "download_failed": "❌ Impossible de télécharger le média.",
+        "too_large": "❌ Le fichier est trop volumineux pour Telegram (limite {limit} Mo).",
         "tiktok_error": "❌ Échec du téléchargement depuis TikTok.",
         "ig_error": "❌ Échec du téléchargement depuis Instagram.",
         "audio_extract_error": "❌ Impossible d'extraire l'audio.",
@@ -174,12 +223,15 @@ texts = {
         "lbl_downloaded": "Téléchargé",
         "lbl_format": "Format",
         "lbl_video_plus_audio": "Vidéo + Audio",
+        "lbl_albums": "Albums et playlists",
+        "btn_audio": "🎵 Audio",
+        "audio_failed": "❌ Impossible de récupérer l'audio. Renvoie le lien.",
         "lbl_since": "Depuis",
         "yes": "Oui",
         "no": "Non",
 
         "free_version": "💎 Version gratuite.",
-        "subscription_names": {"free": "Gratuit 💎"},
+        "subscription_names": {"free": "Gratuit 💎", "premium": "Premium ⭐"},
 
         "settings_title": "⚙️ Paramètres:",
         "profile_title": "👤 Profil",
@@ -207,11 +259,21 @@ texts = {
         "enter_url": "📎 Sende einen Link!",
         "not_understood": "😅 Ich verstehe nicht, benutze die Buttons.",
         "loading": "⏳ Wird heruntergeladen…",
+        "stage_download": "Herunterladen",
+        "stage_merge": "Video und Audio werden zusammengeführt",
+        "stage_audio": "Audio wird verarbeitet",
+        "stage_upload": "Senden",
         "saved": "✔ Gespeichert!",
+        "queued": "🕒 Link in der Warteschlange. Vor dir: {pos}",
+        "queue_full": "🚦 Der Bot ist überlastet, versuche es in einer Minute erneut.",
+        "chat_limit": "⏳ Bitte warte, bis deine vorherigen Downloads fertig sind.",
+        "rate_limited": "⏳ Zu viele Anfragen. Versuch es in {seconds} s noch einmal.",
+        "daily_quota": "📦 Das Tageslimit von {limit} MB für den Tarif „{tier}“ ist aufgebraucht. Versuch es später noch einmal.",
 
         "unsupported": "❌ Diese Plattform wird noch nicht unterstützt.",
         "yt_disabled": "⛔ Herunterladen von YouTube ist deaktiviert.",
         "download_failed": "❌ Medien konnten nicht heruntergeladen werden.",
+        "too_large": "❌ Die Datei ist zu groß für Telegram (Limit {limit} MB).",
         "tiktok_error": "❌ Fehler beim TikTok-Download.",
         "ig_error": "❌ Fehler beim Instagram-Download.",
         "audio_extract_error": "❌ Audio konnte nicht extrahiert werden.",
@@ -222,12 +284,15 @@ texts = {
         "lbl_downloaded": "Heruntergeladen",
         "lbl_format": "Format",
         "lbl_video_plus_audio": "Video + Audio",
+        "lbl_albums": "Alben und Playlists",
+        "btn_audio": "🎵 Audio",
+        "audio_failed": "❌ Audio konnte nicht geladen werden. Schick den Link noch einmal.",
         "lbl_since": "Seit",
         "yes": "Ja",
         "no": "Nein",
 
         "free_version": "💎 Kostenlose Version.",
-        "subscription_names": {"free": "Kostenlos 💎"},
+        "subscription_names": {"free": "Kostenlos 💎", "premium": "Premium ⭐"},
 
         "settings_title": "⚙️ Einstellungen:",
         "profile_title": "👤 Profil",
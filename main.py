@@ -1,13 +1,36 @@
 import os
+import sys
+import hashlib
 import threading
 import time
 import re
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 
 from telebot import TeleBot, types, apihelper
 from flask import Flask, request
-import yt_dlp
+import requests
+
+from workers import DownloadPool, ACCEPTED, QUEUE_FULL, DEFAULT_PRIORITY
+from admission import Admission, Tier, ADMITTED, RATE_LIMITED, OVER_QUOTA
+from jobqueue import JobQueue, QueueWorker, WorkerProcesses
+from journal import JobJournal, DOWNLOADING, POSTPROCESSING, UPLOADING
+from filecache import FileIdCache, make_key
+from singleflight import SingleFlight
+from storage import UserStore
+from dispatcher import UpdateDispatcher, BUSY
+import transport
+from metrics import registry as metrics
+from outbox import Outbox
+from progress import ProgressReporter, UPLOAD
+from urls import canonicalize, media_id_from_url, extractor_key, extract_urls, MetadataCache
+from media import extract_audio, split_merged_parts, pick_format, expected_size, TooLarge, FFMPEG_TIMEOUT
+from spool import Spool, SpoolFull
+from cookiepool import CookiePool
+from profiles import ydl_options, profile_name
+from ydlpool import YdlPool, load_yt_dlp
 
 # ============================================================
 #                     ПІДКЛЮЧЕННЯ МОВ
@@ -26,8 +49,18 @@ except ImportError:
             "profile_title": "Ваш профіль", "lbl_name": "Ім'я", "lbl_subscription": "Підписка",
             "lbl_downloaded": "Завантажено", "lbl_format": "Формат", "lbl_since": "З нами з",
             "lbl_video_plus_audio": "Відео + Аудіо файл", "free_version": "Безкоштовна версія",
+            "lbl_albums": "Альбоми і плейлисти",
+            "btn_audio": "🎵 Аудіо", "audio_failed": "Не вдалося отримати аудіо",
             "help_text": "Надішліть посилання з TikTok, YouTube, Instagram...", 
-            "not_understood": "Я не розумію цю команду."
+            "not_understood": "Я не розумію цю команду.",
+            "queued": "У черзі: {pos}", "queue_full": "Бот перевантажений",
+            "chat_limit": "Зачекай на попередні завантаження",
+            "rate_limited": "Забагато запитів, зачекай {seconds} с",
+            "daily_quota": "Денний ліміт {limit} МБ ({tier}) вичерпано",
+            "subscription_names": {"free": "Безкоштовна", "premium": "Преміум"},
+            "too_large": "Файл завеликий (ліміт {limit} МБ)",
+            "stage_download": "Завантаження", "stage_merge": "Об'єднання",
+            "stage_audio": "Аудіо", "stage_upload": "Відправка"
         }
     }
     # Дублюємо для інших мов, щоб не було помилок
@@ -45,8 +78,12 @@ if not TOKEN:
 WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "https://dowlanderbot.onrender.com")
 WEBHOOK_PATH = f"/{TOKEN}"
 WEBHOOK_URL = WEBHOOK_HOST + WEBHOOK_PATH
+# Секрет, який Telegram надсилає в заголовку X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
 
-bot = TeleBot(TOKEN)
+# Обробники виконуються в потоках диспетчера (порядок у межах чату),
+# тому власний пул потоків telebot не потрібен
+bot = TeleBot(TOKEN, threaded=False)
 app = Flask(__name__)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -54,6 +91,210 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 DOWNLOAD_DIR = "downloads"
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
+# Постійні дані бота (кеш file_id тощо)
+DATA_DIR = os.getenv("DATA_DIR", "data")
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# Пул завантажень: кількість воркерів, розмір черги, ліміт задач на чат
+# (посилання з одного повідомлення приймаються разом, навіть понад ліміт)
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 3))
+DOWNLOAD_QUEUE_SIZE = int(os.getenv("DOWNLOAD_QUEUE_SIZE", 50))
+MAX_JOBS_PER_CHAT = int(os.getenv("MAX_JOBS_PER_CHAT", 2))
+
+# Скільки посилань брати з одного повідомлення і скільки елементів плейлиста
+# чи каруселі качати (альбоми вмикаються в налаштуваннях користувача)
+MAX_URLS_PER_MESSAGE = int(os.getenv("MAX_URLS_PER_MESSAGE", 5))
+ALBUM_MAX_ITEMS = int(os.getenv("ALBUM_MAX_ITEMS", 10))
+
+# Окремі процеси для завантажень (0 — все в одному процесі). Веб-процес кладе
+# задачі в SQLite-чергу і сам запускає WORKER_PROCESSES воркерів (python main.py worker),
+# кожен з DOWNLOAD_WORKERS потоками
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", 0))
+ROLE = "worker" if sys.argv[1:2] == ["worker"] else ("web" if WORKER_PROCESSES > 0 else "single")
+# Через скільки секунд без heartbeat задача вважається покинутою і повертається в чергу
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", 120))
+# Скільки разів пробувати задачу, яку перервав перезапуск чи падіння процесу
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+# Допуск задач за тарифом підписки: запитів за хвилину, байтів за 24 години
+# (0 — без ліміту) і частка загального бюджету; решта бюджету — для платних
+FREE_REQUESTS_PER_MIN = int(os.getenv("FREE_REQUESTS_PER_MIN", 6))
+FREE_DAILY_BYTES = int(os.getenv("FREE_DAILY_BYTES", 2 * 1024 * 1024 * 1024))
+FREE_BUDGET_SHARE = float(os.getenv("FREE_BUDGET_SHARE", 0.8))
+PREMIUM_REQUESTS_PER_MIN = int(os.getenv("PREMIUM_REQUESTS_PER_MIN", 30))
+PREMIUM_DAILY_BYTES = int(os.getenv("PREMIUM_DAILY_BYTES", 0))
+# Скільки задач (у черзі + у роботі) бот бере на себе; понад це — одразу "спробуй пізніше".
+# За замовчуванням ~10 задач на потік-воркер: стільки встигає розібратися за кілька хвилин
+ADMISSION_BUDGET = int(os.getenv("ADMISSION_BUDGET", DOWNLOAD_WORKERS * max(1, WORKER_PROCESSES) * 10))
+
+# Кеш file_id: максимум записів і час життя (сек)
+FILE_CACHE_SIZE = int(os.getenv("FILE_CACHE_SIZE", 5000))
+FILE_CACHE_TTL = int(os.getenv("FILE_CACHE_TTL", 30 * 24 * 3600))
+
+# Локальний Bot API сервер (telegram-bot-api --local) приймає файли до 2 ГБ
+BOT_API_URL = os.getenv("BOT_API_URL")
+
+# Максимальний розмір файлу для відправки (хмарний Bot API: 50 МБ)
+MAX_UPLOAD_BYTES = int(os.getenv(
+    "MAX_UPLOAD_BYTES",
+    2000 * 1024 * 1024 if BOT_API_URL else 50 * 1024 * 1024
+))
+# Розмір шматка при потоковому аплоаді файлів
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 64 * 1024))
+# Скільки можна скачати назад з Telegram через getFile (хмарний Bot API: 20 МБ)
+TG_DOWNLOAD_BYTES = int(os.getenv(
+    "TG_DOWNLOAD_BYTES",
+    MAX_UPLOAD_BYTES if BOT_API_URL else 20 * 1024 * 1024
+))
+
+# Аудіо за кнопкою під відео: скільки (сек) тримати скачане відео на диску,
+# щоб не тягнути його вдруге (0 — не тримати, брати з Telegram або джерела)
+AUDIO_RETAIN_SECONDS = int(os.getenv("AUDIO_RETAIN_SECONDS", 600))
+
+# Спул завантажень: квота на диск (байт), резерв для задачі з невідомим розміром,
+# необов'язковий tmpfs (напр. /dev/shm) для дрібних файлів, прибирання сиріт
+SPOOL_QUOTA = int(os.getenv("SPOOL_QUOTA", 4 * 1024 * 1024 * 1024))
+SPOOL_JOB_RESERVE = int(os.getenv("SPOOL_JOB_RESERVE", min(MAX_UPLOAD_BYTES, 200 * 1024 * 1024)))
+SPOOL_TMPFS_DIR = os.getenv("SPOOL_TMPFS_DIR")
+SPOOL_TMPFS_MAX_FILE = int(os.getenv("SPOOL_TMPFS_MAX_FILE", 20 * 1024 * 1024))
+SPOOL_TMPFS_QUOTA = int(os.getenv("SPOOL_TMPFS_QUOTA", 256 * 1024 * 1024))
+SPOOL_MAX_AGE = int(os.getenv("SPOOL_MAX_AGE", 6 * 3600))
+SPOOL_SWEEP_INTERVAL = int(os.getenv("SPOOL_SWEEP_INTERVAL", 600))
+
+# Cookies для екстракторів: cookies.txt і *.txt з COOKIES_DIR (перечитуються на льоту).
+# Jar, якому платформа відмовила, відпочиває від COOKIES_BENCH_SECONDS (щоразу вдвічі довше);
+# COOKIE_RETRIES — скільки разів одразу повторити з іншими cookies
+COOKIES_FILE = os.getenv("COOKIES_FILE", "cookies.txt")
+COOKIES_DIR = os.getenv("COOKIES_DIR", "cookies")
+COOKIES_BENCH_SECONDS = int(os.getenv("COOKIES_BENCH_SECONDS", 600))
+COOKIES_RELOAD_INTERVAL = int(os.getenv("COOKIES_RELOAD_INTERVAL", 30))
+COOKIE_RETRIES = int(os.getenv("COOKIE_RETRIES", 1))
+
+# Параметри мережі yt-dlp беруться з профілю платформи (profiles.py).
+# DOWNLOAD_RANGE_CONNECTIONS обмежує кількість Range-з'єднань aria2c на файл
+# (0 — не використовувати aria2c, навіть якщо він встановлений)
+DOWNLOAD_RANGE_CONNECTIONS = os.getenv("DOWNLOAD_RANGE_CONNECTIONS")
+DOWNLOAD_RANGE_CONNECTIONS = int(DOWNLOAD_RANGE_CONNECTIONS) if DOWNLOAD_RANGE_CONNECTIONS else None
+
+# Екземпляри YoutubeDL перевикористовуються між задачами (YDL_POOL=0 — новий на кожну).
+# Процес, що качає, після старту у фоні імпортує yt-dlp і готує по екземпляру
+# для профілів з YDL_WARM_PROFILES (порожньо — без прогріву)
+YDL_POOL = os.getenv("YDL_POOL", "1") != "0"
+YDL_WARM_PROFILES = [p.strip() for p in os.getenv("YDL_WARM_PROFILES", "Youtube,Instagram,TikTok,Generic").split(",")
+                     if p.strip()]
+
+# Скільки чекати на спільне завантаження, яке вже качає інший запит (сек)
+FLIGHT_WAIT_TIMEOUT = int(os.getenv("FLIGHT_WAIT_TIMEOUT", 600))
+
+# Диспетчер оновлень: кількість потоків і розмір черги на потік
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", 4))
+DISPATCH_QUEUE_SIZE = int(os.getenv("DISPATCH_QUEUE_SIZE", 1000))
+
+# Як часто скидати зміни профілів на диск (сек)
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", 2))
+
+# Кеш метаданих yt-dlp: посилання на формати швидко застарівають, тому TTL короткий
+META_CACHE_SIZE = int(os.getenv("META_CACHE_SIZE", 500))
+META_CACHE_TTL = int(os.getenv("META_CACHE_TTL", 600))
+
+# Ліміти Telegram: ~30 повідомлень/с глобально, ~1/с у межах чату;
+# одночасних аплоадів медіа не більше TG_UPLOAD_SLOTS
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", 30))
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", 1))
+TG_CHAT_BURST = int(os.getenv("TG_CHAT_BURST", 3))
+TG_UPLOAD_SLOTS = int(os.getenv("TG_UPLOAD_SLOTS", 4))
+
+# Як часто (сек) можна редагувати статус-повідомлення з прогресом
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", 3))
+
+# З'єднання з Bot API: keep-alive пул на всі потоки, що звертаються до API
+# (воркери, диспетчер, прогрес), таймаути (сек) і повтори при мережевих збоях
+TG_POOL_SIZE = int(os.getenv("TG_POOL_SIZE", DOWNLOAD_WORKERS + DISPATCH_WORKERS + 2))
+TG_CONNECT_TIMEOUT = float(os.getenv("TG_CONNECT_TIMEOUT", 5))
+TG_READ_TIMEOUT = float(os.getenv("TG_READ_TIMEOUT", 30))
+TG_UPLOAD_TIMEOUT = float(os.getenv("TG_UPLOAD_TIMEOUT", 300))
+TG_RETRIES = int(os.getenv("TG_RETRIES", 3))
+
+# Потоковий аплоад і спільний пул з'єднань для всіх запитів до Bot API
+transport.install(
+    apihelper,
+    api_url=BOT_API_URL,
+    pool_size=TG_POOL_SIZE,
+    chunk_size=UPLOAD_CHUNK_SIZE,
+    connect_timeout=TG_CONNECT_TIMEOUT,
+    read_timeout=TG_READ_TIMEOUT,
+    upload_timeout=TG_UPLOAD_TIMEOUT,
+    retries=TG_RETRIES
+)
+
+# Усі вихідні виклики Bot API йдуть через планувальник з лімітами Telegram.
+# Глобальний ліміт бота ділиться між веб-процесом і воркерами
+PROCESS_COUNT = 1 if ROLE == "single" else WORKER_PROCESSES + 1
+tg = Outbox(
+    bot,
+    global_rate=TG_GLOBAL_RATE / PROCESS_COUNT,
+    chat_rate=TG_CHAT_RATE,
+    chat_burst=TG_CHAT_BURST,
+    upload_slots=TG_UPLOAD_SLOTS
+)
+
+progress_reporter = ProgressReporter(tg, PROGRESS_INTERVAL)
+
+# Журнал задач: стан і каталог спулу кожної задачі переживають перезапуск
+journal = JobJournal(os.path.join(DATA_DIR, "journal.db"), max_attempts=JOB_MAX_ATTEMPTS)
+
+def kept_spool_dirs():
+    # Викликається прибиральником спулу — заодно чистимо журнал від завершених записів
+    journal.purge(SPOOL_MAX_AGE)
+    return journal.spool_dirs()
+
+# Кожне завантаження — в окремому каталозі спулу; при старті прибираємо залишки
+# (крім каталогів незавершених задач). Квота диска ділиться між процесами-воркерами
+SPOOL_SHARE = WORKER_PROCESSES if ROLE == "worker" else 1
+spool = Spool(
+    DOWNLOAD_DIR,
+    quota=SPOOL_QUOTA // SPOOL_SHARE,
+    default_reserve=SPOOL_JOB_RESERVE,
+    tmpfs_root=SPOOL_TMPFS_DIR,
+    tmpfs_max_file=SPOOL_TMPFS_MAX_FILE,
+    tmpfs_quota=SPOOL_TMPFS_QUOTA // SPOOL_SHARE,
+    max_age=SPOOL_MAX_AGE,
+    sweep_interval=SPOOL_SWEEP_INTERVAL,
+    keep=kept_spool_dirs
+)
+spool.start()
+
+# ============================================================
+#                       МЕТРИКИ
+# ============================================================
+
+STAGE_SECONDS = metrics.histogram(
+    "dowlander_stage_seconds", "Time spent per processing stage", ["stage"]
+)
+JOBS = metrics.counter(
+    "dowlander_jobs_total", "Download jobs by platform and outcome", ["platform", "outcome"]
+)
+BYTES = metrics.counter(
+    "dowlander_bytes_total", "Media bytes downloaded from sources and uploaded to Telegram", ["direction"]
+)
+CACHE_LOOKUPS = metrics.counter(
+    "dowlander_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"]
+)
+ADMISSIONS = metrics.counter(
+    "dowlander_admission_total", "Download requests by subscription tier and admission result", ["tier", "result"]
+)
+
+cookie_pool = CookiePool(
+    files=[COOKIES_FILE],
+    directory=COOKIES_DIR,
+    bench_seconds=COOKIES_BENCH_SECONDS,
+    reload_interval=COOKIES_RELOAD_INTERVAL
+)
+
+file_cache = FileIdCache(os.path.join(DATA_DIR, "file_cache.db"), FILE_CACHE_SIZE, FILE_CACHE_TTL)
+meta_cache = MetadataCache(META_CACHE_SIZE, META_CACHE_TTL)
+ydl_pool = YdlPool(enabled=YDL_POOL)
+
 LANGUAGE_OPTIONS = [
     ("uk", "🇺🇦 Українська"),
     ("en", "🇬🇧 English"),
@@ -82,100 +323,304 @@ def build_cmd_map():
 
 CMD = build_cmd_map()
 
-# ============================================================
-#               ЗБЕРЕЖЕННЯ В ПАМ'ЯТІ (RAM)
-# ============================================================
-
-# Словник для зберігання даних користувачів в оперативній пам'яті
-users = {} 
+CLEAN_RE = re.compile(r"[^a-zA-Zа-яА-ЯіІїЇєЄ0-9]+")
 
 def clean_text(text):
-    return re.sub(r"[^a-zA-Zа-яА-ЯіІїЇєЄ0-9]+", "", text or "").lower()
+    return CLEAN_RE.sub("", text or "").lower()
 
-def match_cmd(text):
-    text = clean_text(text)
+def build_cmd_index():
+    # Очищений текст кнопки -> команда; перший збіг має пріоритет, як і раніше
+    index = {}
     for cmd, variants in CMD.items():
         for v in variants:
-            if clean_text(v) == text:
-                return cmd
-    return None
+            index.setdefault(clean_text(v), cmd)
+    return index
+
+CMD_INDEX = build_cmd_index()
+
+def match_cmd(text):
+    return CMD_INDEX.get(clean_text(text))
+
+# ============================================================
+#               ЗБЕРЕЖЕННЯ КОРИСТУВАЧІВ
+# ============================================================
+
+# Профілі в SQLite + кеш у пам'яті, запис пачками у фоні
+users = UserStore(os.path.join(DATA_DIR, "users.db"), USER_FLUSH_INTERVAL)
 
 def get_user(u):
     uid = str(u.id)
-    if uid not in users:
-        # Створення профілю (живе до перезапуску бота)
-        users[uid] = {
+    user = users.get(uid)
+    if user is None:
+        # Створення профілю (зберігається в базі між перезапусками)
+        user = users.create(uid, {
             "name": u.first_name or "User",
             "subscription": "free",
             "videos_downloaded": 0,
             "joined": datetime.now().strftime("%Y-%m-%d %H:%M"),
             "language": "uk",
             "format": "mp4",
-            "video_plus_audio": True
-        }
+            "video_plus_audio": False,
+            "albums": False
+        })
     
     # Перевірка наявності мови
-    if users[uid]["language"] not in texts:
-        users[uid]["language"] = "uk"
+    if user["language"] not in texts:
+        users.update(uid, language="uk")
 
-    return users[uid]
+    return user
 
 # ============================================================
 #                     КЛАВІАТУРИ
 # ============================================================
 
-def main_menu(user):
-    t = texts[user["language"]]
+# Клавіатури залежать лише від мови і налаштувань, тому будуються один раз
+# на кожен стан і зберігаються вже готовим JSON (telebot передає рядок як є)
+
+@lru_cache(maxsize=None)
+def build_main_menu(lang):
+    t = texts[lang]
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.row(f"📋 {t['menu']}", f"👤 {t['profile']}")
     kb.row(f"⚙️ {t['settings']}", f"💎 {t['subscription']}")
     kb.row(f"🌍 {t['language']}", f"ℹ️ {t['help']}")
-    return kb
+    return kb.to_json()
 
-def settings_keyboard(user):
-    t = texts[user["language"]]
+@lru_cache(maxsize=None)
+def build_settings_keyboard(lang, fmt, video_plus_audio, albums):
+    t = texts[lang]
     kb = types.InlineKeyboardMarkup()
     kb.row(
-        types.InlineKeyboardButton(f"{'✅ ' if user['format']=='mp4' else ''}MP4", callback_data="format_mp4"),
-        types.InlineKeyboardButton(f"{'✅ ' if user['format']=='mp3' else ''}MP3", callback_data="format_mp3")
+        types.InlineKeyboardButton(f"{'✅ ' if fmt=='mp4' else ''}MP4", callback_data="format_mp4"),
+        types.InlineKeyboardButton(f"{'✅ ' if fmt=='mp3' else ''}MP3", callback_data="format_mp3")
     )
-    state = t["yes"] if user["video_plus_audio"] else t["no"]
+    state = t["yes"] if video_plus_audio else t["no"]
     kb.add(types.InlineKeyboardButton(f"{t['lbl_video_plus_audio']}: {state}", callback_data="toggle_vpa"))
+    state = t["yes"] if albums else t["no"]
+    kb.add(types.InlineKeyboardButton(f"{t['lbl_albums']}: {state}", callback_data="toggle_albums"))
     kb.add(types.InlineKeyboardButton(f"⬅ {t['back']}", callback_data="cmd_back"))
-    return kb
+    return kb.to_json()
 
+@lru_cache(maxsize=None)
 def language_keyboard():
     kb = types.InlineKeyboardMarkup()
     for code, name in LANGUAGE_OPTIONS:
         kb.add(types.InlineKeyboardButton(name, callback_data=f"lang_{code}"))
-    return kb
+    return kb.to_json()
+
+def main_menu(user):
+    return build_main_menu(user["language"])
+
+def settings_keyboard(user):
+    return build_settings_keyboard(user["language"], user["format"], user["video_plus_audio"], user["albums"])
+
+def audio_keyboard(lang, token):
+    kb = types.InlineKeyboardMarkup()
+    kb.add(types.InlineKeyboardButton(texts[lang]["btn_audio"], callback_data=f"audio:{token}"))
+    return kb.to_json()
+
+# ============================================================
+#                КЕШ TELEGRAM file_id
+# ============================================================
+
+def cache_key_for(media_id, user):
+    if not media_id:
+        return None
+    key = make_key(media_id[0], media_id[1], user["format"], user["video_plus_audio"])
+    # Альбом (плейлист, карусель) кешується окремо від одиночного відео
+    return key + ":album" if user.get("albums") else key
+
+def file_id_of(msg):
+    if msg.photo:
+        return msg.photo[-1].file_id
+    media = msg.video or msg.audio or msg.document
+    return media.file_id if media else None
+
+def send_from_cache(chat_id, entry, user):
+    # Повторна відправка за file_id: без завантаження і без аплоаду
+    if entry.get("album"):
+        send_album(chat_id, [(item["type"], item["file_id"]) for item in entry["album"]], entry.get("title"))
+    elif user["format"] == "mp4":
+        markup = None
+        if not user["video_plus_audio"] and entry.get("audio_token"):
+            markup = audio_keyboard(user["language"], entry["audio_token"])
+        tg.send_video(
+            chat_id, entry["video"],
+            caption=f"{entry.get('title')}\n@dowlanderbot",
+            supports_streaming=True,
+            reply_markup=markup
+        )
+        if user["video_plus_audio"] and entry.get("audio"):
+            tg.send_audio(
+                chat_id, entry["audio"],
+                caption=f"{entry.get('title')} — Audio\n@dowlanderbot"
+            )
+    else:
+        tg.send_audio(chat_id, entry["audio"], caption="@dowlanderbot")
+
+# ============================================================
+#                 АЛЬБОМИ (sendMediaGroup)
+# ============================================================
+
+ALBUM_BATCH = 10   # ліміт Telegram на один sendMediaGroup
+IMAGE_EXTS = {"jpg", "jpeg", "png", "webp"}
+INPUT_MEDIA = {"video": types.InputMediaVideo, "photo": types.InputMediaPhoto, "audio": types.InputMediaAudio}
+SEND_ONE = {"video": "send_video", "photo": "send_photo", "audio": "send_audio"}
+
+def send_cached(chat_id, user, media_id, lookup="file_id"):
+    # Відео, вже надіслане в цьому форматі, — одразу за file_id. True, якщо відповіли
+    url_key = cache_key_for(media_id, user)
+    if not url_key:
+        return False
+    entry = file_cache.get(url_key)
+    CACHE_LOOKUPS.inc(cache=lookup, result="miss" if entry is None else "hit")
+    if not entry:
+        return False
+    try:
+        send_from_cache(chat_id, entry, user)
+    except apihelper.ApiTelegramException as e:
+        # file_id став недійсним — качаємо заново
+        logging.warning(f"Cached file_id rejected: {e}")
+        file_cache.delete(url_key)
+        return False
+    users.incr(user["id"], "videos_downloaded")
+    JOBS.inc(platform=media_id[0], outcome="cached")
+    return True
+
+def send_album(chat_id, items, title):
+    # items: [(тип, файл або file_id)]. Пачки до 10 — один виклик API замість десяти
+    caption = f"{title}\n@dowlanderbot"
+    file_ids = []
+    for start in range(0, len(items), ALBUM_BATCH):
+        batch = items[start:start + ALBUM_BATCH]
+        first = caption if start == 0 else None
+        if len(batch) == 1:
+            kind, media = batch[0]
+            sent = [getattr(tg, SEND_ONE[kind])(chat_id, media, caption=first)]
+        else:
+            group = [
+                INPUT_MEDIA[kind](media, caption=first if i == 0 else None)
+                for i, (kind, media) in enumerate(batch)
+            ]
+            sent = tg.send_media_group(chat_id, group)
+        file_ids.extend(file_id_of(m) for m in sent)
+    return file_ids
 
 # ============================================================
 #              ЗАВАНТАЖЕННЯ ВІДЕО + АУДІО
 # ============================================================
 
-def run_download_task(url, chat_id, user, lang):
-    t = texts[lang]
-    file_path = None
-    message_id = None
+def extract_metadata(ydl, url, album=False):
+    # Метадані з кешу за канонічним id, інакше — повна екстракція
+    media = media_id_from_url(url)
+    key = f"{media[0]}:{media[1]}" if media else url
+    if album:
+        key += ":album"
+    info = meta_cache.get(key)
+    CACHE_LOOKUPS.inc(cache="metadata", result="miss" if info is None else "hit")
+    if info is None:
+        with STAGE_SECONDS.time(stage="metadata"):
+            raw = ydl.extract_info(url, download=False)
+            info = ydl.sanitize_info(raw, remove_private_keys=True)
+            if raw.get("_type") == "playlist":
+                # remove_private_keys прибирає й entries — елементи очищаємо окремо
+                info["entries"] = [
+                    ydl.sanitize_info(e, remove_private_keys=True) if e else None for e in raw.get("entries") or []
+                ]
+        meta_cache.put(key, info)
+    return info
+
+def spool_job(estimate, job_id):
+    # Задача після перезапуску продовжує у своєму каталозі: yt-dlp докачує .part
+    row = journal.get(job_id) if job_id else None
+    if row and row["spool"] and os.path.isdir(row["spool"]):
+        job = spool.adopt(row["spool"], estimate)
+        logging.info(f"Resuming job {job_id} in {job.path}")
+    else:
+        job = spool.job(estimate)
+    if job_id:
+        journal.set_state(job_id, DOWNLOADING, spool=job.path)
+    return job
+
+def journal_pp_hook(job_id):
+    def hook(d):
+        if d.get("status") == "started":
+            journal.set_state(job_id, POSTPROCESSING)
+    return hook
+
+def ffmpeg_clock():
+    # Постпроцесори yt-dlp (FFmpegMerger, FFmpegExtractAudio, фікси) працюють усередині
+    # process_ie_result — їхній час іде в стадію "ffmpeg" і віднімається від "download"
+    clock = {"started": None, "total": 0.0}
+
+    def stop():
+        if clock["started"] is not None:
+            elapsed = time.perf_counter() - clock["started"]
+            clock["started"] = None
+            clock["total"] += elapsed
+            STAGE_SECONDS.observe(elapsed, stage="ffmpeg")
 
+    def hook(d):
+        if d.get("postprocessor") == "MoveFilesAfterDownload":
+            return   # лише перейменування файлів, не ffmpeg
+        if d.get("status") == "started":
+            clock["started"] = time.perf_counter()
+        elif d.get("status") == "finished":
+            stop()
+
+    clock["hook"] = hook
+    clock["stop"] = stop
+    return clock
+
+def process_timed(ydl, info, clock):
+    start = time.perf_counter()
+    before = clock["total"]
     try:
-        m = bot.send_message(chat_id, f"⏳ {t['loading']}...")
-        message_id = m.message_id
-    except:
-        return
+        return ydl.process_ie_result(info, download=True)
+    finally:
+        # Постпроцесор упав — "finished" не прийде
+        clock["stop"]()
+        STAGE_SECONDS.observe(time.perf_counter() - start - (clock["total"] - before), stage="download")
 
-    ts = int(time.time())
+def download_media(url, chat_id, user, progress=None, job_id=None):
+    DownloadError = load_yt_dlp().utils.DownloadError
+    # Платформа відмовила цим cookies (логін, 429) — одразу пробуємо з наступними
+    for attempt in range(COOKIE_RETRIES + 1):
+        lease = cookie_pool.lease(url)
+        try:
+            media = _download_media(url, chat_id, user, progress, job_id, lease)
+        except DownloadError as e:
+            if not cookie_pool.report(lease, e) or attempt == COOKIE_RETRIES:
+                raise
+            continue
+        cookie_pool.report(lease)
+        return media
 
-    # Налаштування без лімітів розміру
-    ydl_opts = {
-        "outtmpl": f"{DOWNLOAD_DIR}/{chat_id}_{ts}_%(id)s.%(ext)s",
+def _download_media(url, chat_id, user, progress, job_id, lease):
+    # Завантаження + ffmpeg. Повертає шляхи до готових файлів.
+    # Фрагменти, чанки, повтори і таймаути — з профілю платформи
+    ie_key = extractor_key(url)
+    ydl_opts = ydl_options(ie_key, DOWNLOAD_RANGE_CONNECTIONS)
+    ydl_opts.update({
+        # Каталог задачі підставляється після оцінки розміру (paths.home)
+        "outtmpl": "%(id)s.%(ext)s",
         "quiet": True,
-        "noplaylist": True,
+        "noprogress": True,
+        "noplaylist": not user.get("albums"),
         "no_warnings": True,
-        "http_headers": {"User-Agent": "Mozilla/5.0"},
-        # Ліміт прибрано, але Telegram не прийме >50MB
-    }
+        "http_headers": {"User-Agent": lease.user_agent},
+    })
+    if lease.jar:
+        ydl_opts["cookiefile"] = lease.cookiefile()
+    if user.get("albums"):
+        ydl_opts["playlistend"] = ALBUM_MAX_ITEMS
+    if progress:
+        ydl_opts["progress_hooks"] = [progress.hook]
+        ydl_opts["postprocessor_hooks"] = [progress.pp_hook]
+    if job_id:
+        ydl_opts.setdefault("postprocessor_hooks", []).append(journal_pp_hook(job_id))
+    clock = ffmpeg_clock()
+    ydl_opts.setdefault("postprocessor_hooks", []).append(clock["hook"])
 
     if user["format"] == "mp3":
         ydl_opts.update({
@@ -187,82 +632,627 @@ def run_download_task(url, chat_id, user, lang):
             }]
         })
     else:
-        # Завантажуємо найкращу якість
+        # Завантажуємо найкращу якість (окремі відео й аудіо потоки зливаються);
+        # "Відео + Аудіо" впливає лише на те, чи надсилати ще й окремий аудіофайл
+        ydl_opts["format"] = "bestvideo[ext=mp4]+bestaudio/best/best[ext=mp4]/best"
         if user["video_plus_audio"]:
-            ydl_opts["format"] = "bestvideo[ext=mp4]+bestaudio/best/best[ext=mp4]/best"
-        else:
-            ydl_opts["format"] = "best[ext=mp4]/best"
+            # Аудіодоріжка після злиття лишається окремим файлом — готовий аудіо-результат
+            ydl_opts["keepvideo"] = True
 
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+    with ydl_pool.session(profile_name(ie_key), ydl_opts) as ydl:
+        # Спершу лише метадані: оцінюємо розмір і обираємо формат під ліміт,
+        # щоб не качати файл, який Telegram все одно не прийме
+        info = extract_metadata(ydl, url, album=bool(user.get("albums")))
+        if info.get("_type") == "playlist":
+            return download_album(ydl, info, user, clock, job_id)
+        spec = pick_format(
+            info,
+            audio_only=user["format"] == "mp3",
+            budget=MAX_UPLOAD_BYTES
+        )
+        if spec:
+            ydl.format_selector = ydl.build_format_selector(spec)
+        # Резерв місця під оцінений розмір; SpoolFull, якщо диск уже зайнятий
+        job = spool_job(expected_size(info, spec, user["format"] == "mp3"), job_id)
+        ydl.params["paths"] = {"home": job.path}
+        try:
+            info = process_timed(ydl, info, clock)
             filename = ydl.prepare_filename(info)
+        except BaseException:
+            spool.release(job)
+            raise
 
-            if user["format"] == "mp3":
-                filename = filename.rsplit(".", 1)[0] + ".mp3"
-
-            if not os.path.exists(filename):
-                raise Exception("File missing")
-
-            file_path = filename
-            
-            # Перевірка розміру для логування (Telegram ліміт ~50MB)
-            file_size = os.path.getsize(file_path)
-            if file_size > 50 * 1024 * 1024:
-                bot.send_message(chat_id, "⚠️ Файл занадто великий (>50MB). Telegram може не дозволити його відправити.")
-
-            # ВІДПРАВКА ВІДЕО
-            if user["format"] == "mp4":
-                with open(file_path, "rb") as f:
-                    bot.send_video(
-                        chat_id, f,
-                        caption=f"{info.get('title')}\n@dowlanderbot",
-                        supports_streaming=True
-                    )
-
-                # Екстракція аудіо (залишено стару логіку через ffmpeg, як ви просили)
-                if user["video_plus_audio"]:
-                    audio_path = file_path.rsplit(".", 1)[0] + ".mp3"
-                    cmd = f'ffmpeg -i "{file_path}" -vn -acodec mp3 -y "{audio_path}" -loglevel quiet'
-                    os.system(cmd)
-
-                    if os.path.exists(audio_path):
-                        time.sleep(0.4)
-                        with open(audio_path, "rb") as af:
-                            bot.send_audio(
-                                chat_id, af,
-                                caption=f"{info.get('title')} — Audio\n@dowlanderbot"
-                            )
-                        os.remove(audio_path)
-
-            # ВІДПРАВКА ТІЛЬКИ АУДІО (MP3 режим)
+    try:
+        if user["format"] == "mp3":
+            filename = filename.rsplit(".", 1)[0] + ".mp3"
+
+        if not os.path.exists(filename):
+            raise Exception("File missing")
+
+        media = {"info": info, "path": filename, "job": job, "audio": None}
+        BYTES.inc(os.path.getsize(filename), direction="download")
+
+        if user["format"] == "mp4" and user["video_plus_audio"]:
+            audio_path, leftovers = split_merged_parts(info)
+            for path in leftovers:
+                remove_file(path)
+            if audio_path:
+                # Аудіо вже є після злиття — без другого проходу ffmpeg
+                media["audio"] = Future()
+                media["audio"].set_result(audio_path)
             else:
-                with open(file_path, "rb") as f:
-                    bot.send_audio(chat_id, f, caption="@dowlanderbot")
+                # Один файл з відео і звуком: витягуємо доріжку паралельно з аплоадом відео
+                media["audio"] = audio_executor.submit(extract_audio_timed, filename, info.get("acodec"))
+    except BaseException:
+        spool.release(job)
+        raise
+
+    return media
+
+def download_album(ydl, info, user, clock, job_id=None):
+    DownloadError = load_yt_dlp().utils.DownloadError
+    # Плейлист або карусель: кожен елемент — свій формат під ліміт, усе в одному каталозі задачі
+    audio_only = user["format"] == "mp3"
+    # Альбоми вимкнені, а екстрактор усе одно віддав список — беремо перший елемент
+    limit = ALBUM_MAX_ITEMS if user.get("albums") else 1
+    default_selector = ydl.format_selector
+    plan = []
+    for entry in (info.get("entries") or [])[:limit]:
+        if not entry:
+            continue
+        try:
+            spec = pick_format(entry, audio_only=audio_only, budget=MAX_UPLOAD_BYTES)
+        except TooLarge as e:
+            logging.info(f"Album item skipped, too large: {e}")
+            continue
+        plan.append((entry, spec, expected_size(entry, spec, audio_only) or SPOOL_JOB_RESERVE))
+    if not plan:
+        raise TooLarge("no album item fits")
+
+    job = spool_job(sum(size for _, _, size in plan), job_id)
+    ydl.params["paths"] = {"home": job.path}
+    items = []
+    try:
+        for entry, spec, _ in plan:
+            ydl.format_selector = ydl.build_format_selector(spec) if spec else default_selector
+            try:
+                entry = process_timed(ydl, entry, clock)
+            except DownloadError as e:
+                logging.warning(f"Album item failed: {e}")
+                continue
+            path = ydl.prepare_filename(entry)
+            if audio_only:
+                path = path.rsplit(".", 1)[0] + ".mp3"
+            if not os.path.exists(path):
+                continue
+            BYTES.inc(os.path.getsize(path), direction="download")
+            kind = "audio" if audio_only else ("photo" if entry.get("ext") in IMAGE_EXTS else "video")
+            items.append((kind, path))
+        if not items:
+            raise Exception("No album items downloaded")
+    except BaseException:
+        spool.release(job)
+        raise
+    return {"info": info, "album": items, "path": None, "job": job, "audio": None}
+
+def extract_audio_timed(path, acodec, dst_dir=None):
+    with STAGE_SECONDS.time(stage="ffmpeg"):
+        return extract_audio(path, acodec, dst_dir)
+
+def media_bytes(media):
+    paths = [path for _, path in media["album"]] if media.get("album") else [media["path"]]
+    return sum(os.path.getsize(p) for p in paths if p and os.path.exists(p))
+
+def remove_file(path):
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+    except: pass
+
+def remove_media(media):
+    # Каталог задачі видаляється цілком: .part, проміжні потоки, витягнуте аудіо
+    if media.get("retain"):
+        # Під відео є кнопка аудіо — файл ще знадобиться, спул видалить його пізніше
+        spool.retain(media["job"], AUDIO_RETAIN_SECONDS)
+        return
+    audio = media.get("audio")
+    if audio and not audio.done():
+        # Екстракція ще триває — каталог видалиться, щойно вона завершиться
+        audio.add_done_callback(lambda f: spool.release(media["job"]))
+        return
+    with STAGE_SECONDS.time(stage="cleanup"):
+        spool.release(media["job"])
+
+def upload_media(chat_id, media, user):
+    with STAGE_SECONDS.time(stage="upload"):
+        return _upload_media(chat_id, media, user)
+
+def upload_album(chat_id, media):
+    info = media["info"]
+    items = []
+    for kind, path in media["album"]:
+        size = os.path.getsize(path)
+        if size > MAX_UPLOAD_BYTES:
+            logging.info(f"Album item too large for upload: {size} bytes")
+            continue
+        items.append((kind, path, size))
+    if not items:
+        raise TooLarge("no album item fits")
+
+    files = [open(path, "rb") for _, path, _ in items]
+    try:
+        file_ids = send_album(chat_id, [(kind, f) for (kind, _, _), f in zip(items, files)], info.get("title"))
+    finally:
+        for f in files:
+            f.close()
+    BYTES.inc(sum(size for _, _, size in items), direction="upload")
+    return {
+        "title": info.get("title"),
+        "album": [{"type": kind, "file_id": fid} for (kind, _, _), fid in zip(items, file_ids)]
+    }
+
+def _upload_media(chat_id, media, user):
+    # Відправка файлів у чат. Повертає file_id для кешу
+    if media.get("album"):
+        return upload_album(chat_id, media)
+    info = media["info"]
+    file_path = media["path"]
+    entry = {"title": info.get("title")}
+
+    # Оцінка розміру могла помилитись — не аплоадимо файл, який не пройде
+    file_size = os.path.getsize(file_path)
+    if file_size > MAX_UPLOAD_BYTES:
+        raise TooLarge(f"{file_size} bytes")
+
+    # ВІДПРАВКА ВІДЕО
+    if user["format"] == "mp4":
+        # Без окремого аудіофайлу — кнопка, що витягне аудіо лише на запит
+        token = None if user["video_plus_audio"] else audio_token(info)
+        with open(file_path, "rb") as f:
+            sent = tg.send_video(
+                chat_id, f,
+                caption=f"{info.get('title')}\n@dowlanderbot",
+                supports_streaming=True,
+                reply_markup=audio_keyboard(user["language"], token) if token else None
+            )
+        entry["video"] = file_id_of(sent)
+        BYTES.inc(file_size, direction="upload")
+        if token and entry["video"]:
+            remember_audio_source(token, info, entry["video"], file_path, file_size)
+            entry["audio_token"] = token
+            if AUDIO_RETAIN_SECONDS > 0:
+                media["retain"] = True
+
+        audio_path = None
+        if user["video_plus_audio"] and media.get("audio"):
+            try:
+                audio_path = media["audio"].result(timeout=FFMPEG_TIMEOUT)
+            except Exception as e:
+                logging.error(f"AUDIO EXTRACT ERROR: {e}")
+        if audio_path and os.path.exists(audio_path):
+            with open(audio_path, "rb") as af:
+                sent = tg.send_audio(
+                    chat_id, af,
+                    caption=f"{info.get('title')} — Audio\n@dowlanderbot"
+                )
+            entry["audio"] = file_id_of(sent)
+            BYTES.inc(os.path.getsize(audio_path), direction="upload")
+
+    # ВІДПРАВКА ТІЛЬКИ АУДІО (MP3 режим)
+    else:
+        with open(file_path, "rb") as f:
+            sent = tg.send_audio(chat_id, f, caption="@dowlanderbot")
+        entry["audio"] = file_id_of(sent)
+        BYTES.inc(file_size, direction="upload")
+
+    return entry
+
+def deliver_media(chat_id, flight, user):
+    # Перший учасник аплоадить файл, інші повторно шлють його file_id
+    with flight.upload_lock:
+        if flight.entry:
+            try:
+                send_from_cache(chat_id, flight.entry, user)
+                return flight.entry
+            except apihelper.ApiTelegramException as e:
+                logging.warning(f"Shared file_id rejected: {e}")
+        entry = upload_media(chat_id, flight.result, user)
+        if not flight.entry:
+            flight.entry = entry
+        return entry
+
+# ============================================================
+#                 АУДІО НА ЗАПИТ (кнопка під відео)
+# ============================================================
+
+def audio_token(info):
+    # Коротке значення для callback_data (ліміт Telegram — 64 байти)
+    source = f"{info.get('extractor_key')}:{info.get('id') or info.get('webpage_url')}"
+    return hashlib.sha1(source.encode()).hexdigest()[:16]
+
+def remember_audio_source(token, info, video_file_id, path, size):
+    # Звідки брати аудіо: збережений на диску файл, file_id відео в Telegram або джерело
+    key = f"audio:{token}"
+    old = file_cache.get(key) or {}
+    file_cache.put(key, {
+        "title": info.get("title"),
+        "url": info.get("webpage_url") or info.get("original_url"),
+        "acodec": info.get("acodec"),
+        "video": video_file_id,
+        "size": size,
+        "path": path if AUDIO_RETAIN_SECONDS > 0 else None,
+        "expires": time.time() + AUDIO_RETAIN_SECONDS,
+        "audio": old.get("audio")
+    })
+
+def fetch_telegram_file(file_id, dst_dir):
+    # Файл назад з Telegram; локальний Bot API сервер віддає шлях на своєму диску
+    f = tg.get_file(file_id)
+    if os.path.isabs(f.file_path) and os.path.exists(f.file_path):
+        return f.file_path
+    url = (apihelper.FILE_URL or "https://api.telegram.org/file/bot{0}/{1}").format(TOKEN, f.file_path)
+    path = os.path.join(dst_dir, os.path.basename(f.file_path) or "video.mp4")
+    with requests.get(url, stream=True, timeout=60) as r:
+        r.raise_for_status()
+        with open(path, "wb") as out:
+            for chunk in r.iter_content(UPLOAD_CHUNK_SIZE):
+                out.write(chunk)
+    return path
+
+def audio_from_video(source, acodec, job):
+    if not source:
+        return None
+    try:
+        return extract_audio_timed(source, acodec, job.path)
+    except Exception as e:
+        logging.warning(f"Audio from {source} failed: {e}")
+        return None
+
+def run_audio_task(token, chat_id, user, lang):
+    t = texts[lang]
+    key = f"audio:{token}"
+    source = file_cache.get(key)
+    CACHE_LOOKUPS.inc(cache="audio", result="miss" if source is None or not source.get("audio") else "hit")
+    if source is None:
+        tg.send_message(chat_id, t["audio_failed"])
+        return
+    caption = f"{source.get('title')} — Audio\n@dowlanderbot"
+
+    if source.get("audio"):
+        try:
+            tg.send_audio(chat_id, source["audio"], caption=caption)
+            JOBS.inc(platform="audio", outcome="cached")
+            return
+        except apihelper.ApiTelegramException as e:
+            logging.warning(f"Cached audio file_id rejected: {e}")
+
+    job = None
+    media = None
+    try:
+        job = spool.job(source.get("size"))
+        # 1) відео, яке ще лежить на диску після відправки
+        path = source.get("path")
+        fresh = path and source.get("expires", 0) > time.time() and os.path.exists(path)
+        audio_path = audio_from_video(path if fresh else None, source.get("acodec"), job)
+        # 2) відео з Telegram за file_id (getFile має свій ліміт розміру)
+        if not audio_path and source.get("video") and (source.get("size") or 0) <= TG_DOWNLOAD_BYTES:
+            try:
+                with STAGE_SECONDS.time(stage="download"):
+                    path = fetch_telegram_file(source["video"], job.path)
+            except Exception as e:
+                logging.warning(f"Telegram getFile failed: {e}")
+                path = None
+            audio_path = audio_from_video(path, source.get("acodec"), job)
+        # 3) лише аудіодоріжка заново з джерела
+        if not audio_path and source.get("url"):
+            media = download_media(source["url"], chat_id, dict(user, format="mp3", albums=False))
+            admission.record_bytes(user["id"], media_bytes(media))
+            audio_path = media["path"]
+        if not audio_path:
+            raise Exception("No audio source")
+
+        with STAGE_SECONDS.time(stage="upload"):
+            with open(audio_path, "rb") as af:
+                sent = tg.send_audio(chat_id, af, caption=caption)
+        BYTES.inc(os.path.getsize(audio_path), direction="upload")
+        source["audio"] = file_id_of(sent)
+        file_cache.put(key, source)
+        JOBS.inc(platform="audio", outcome="ok")
+    except SpoolFull as e:
+        logging.warning(f"Spool full: {e}")
+        JOBS.inc(platform="audio", outcome="spool_full")
+        tg.send_message(chat_id, t["queue_full"])
+    except Exception as e:
+        logging.error(f"AUDIO ERROR: {e}")
+        JOBS.inc(platform="audio", outcome="failed")
+        tg.send_message(chat_id, t["audio_failed"])
+    finally:
+        spool.release(job)
+        if media:
+            remove_media(media)
+
+flights = SingleFlight(remove_media)
+audio_executor = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix="audio")
+
+def run_download_task(url, chat_id, user, lang, job_id=None):
+    t = texts[lang]
+    message_id = None
+
+    # Однакові посилання в різних формах -> один канонічний URL (і один ключ кешу)
+    url = canonicalize(url, keep_playlist=bool(user.get("albums")))
+
+    media_id = media_id_from_url(url)
+    platform = media_id[0] if media_id else "generic"
+
+    url_key = cache_key_for(media_id, user)
+    # Повтори зазвичай відповідає вже message_handler; тут — file_id, що з'явився,
+    # поки задача чекала в черзі, або id, відомий лише після розкриття короткого посилання
+    if send_cached(chat_id, user, media_id, lookup="file_id_recheck"):
+        return
 
-            user["videos_downloaded"] += 1
-            # save_users більше не потрібен
+    try:
+        m = tg.send_message(chat_id, f"⏳ {t['loading']}...")
+        message_id = m.message_id
+    except:
+        return
+    if job_id:
+        journal.set_message(job_id, message_id)
+
+    # Однакові запити (те саме відео і формат) ділять одне завантаження
+    flight_key = url_key or f"url:{url}:{user['format']}:{int(user['video_plus_audio'])}:{int(bool(user.get('albums')))}"
+    flight, leader = flights.join(flight_key)
+    progress = None
+
+    try:
+        if leader:
+            progress = flight.progress = progress_reporter.start(chat_id, message_id, t)
+            try:
+                media = download_media(url, chat_id, user, progress, job_id)
+            except BaseException as e:
+                flights.finish(flight_key, flight, error=e)
+                raise
+            flights.finish(flight_key, flight, result=media)
+            # У денну квоту йде те, що бот справді скачав (кеш і спільні завантаження — ні)
+            admission.record_bytes(user["id"], media_bytes(media))
+        else:
+            progress = flight.progress
+            if progress:
+                progress.add_target(chat_id, message_id, t)
+            if not flight.wait(FLIGHT_WAIT_TIMEOUT):
+                raise Exception("Timed out waiting for shared download")
+            if isinstance(flight.error, (TooLarge, SpoolFull)):
+                raise flight.error
+            if flight.error:
+                raise Exception(f"Shared download failed: {flight.error}")
+            media = flight.result
+
+        if progress:
+            progress.set_stage(UPLOAD)
+        if job_id:
+            journal.set_state(job_id, UPLOADING)
+        entry = deliver_media(chat_id, flight, user)
+        users.incr(user["id"], "videos_downloaded")
+        JOBS.inc(platform=platform, outcome="ok" if leader else "shared")
+
+        # Запам'ятовуємо file_id і під ключем з URL, і під справжнім id відео
+        if entry.get("video") or entry.get("audio") or entry.get("album"):
+            info = media["info"]
+            info_key = make_key(info.get("extractor_key"), info.get("id"), user["format"], user["video_plus_audio"])
+            if media.get("album"):
+                info_key += ":album"
+            for key in {url_key, info_key}:
+                if key:
+                    file_cache.put(key, entry)
+
+    except TooLarge as e:
+        logging.info(f"Too large for upload: {e}")
+        JOBS.inc(platform=platform, outcome="too_large")
+        tg.send_message(chat_id, t["too_large"].format(limit=MAX_UPLOAD_BYTES // (1024 * 1024)))
+
+    except SpoolFull as e:
+        logging.warning(f"Spool full: {e}")
+        JOBS.inc(platform=platform, outcome="spool_full")
+        tg.send_message(chat_id, t["queue_full"])
 
     except apihelper.ApiTelegramException as e:
+        JOBS.inc(platform=platform, outcome="telegram_error")
         if "Request Entity Too Large" in str(e):
-             bot.send_message(chat_id, "❌ Файл занадто великий для відправки через Telegram (Ліміт 50МБ).")
+             tg.send_message(chat_id, t["too_large"].format(limit=MAX_UPLOAD_BYTES // (1024 * 1024)))
         else:
              logging.error(f"Telegram API Error: {e}")
-             bot.send_message(chat_id, "❌ Помилка при відправці файлу.")
+             tg.send_message(chat_id, "❌ Помилка при відправці файлу.")
 
     except Exception as e:
         logging.error(f"DOWNLOAD ERROR: {e}")
-        bot.send_message(chat_id, f"❌ {t['download_failed']}")
+        JOBS.inc(platform=platform, outcome="failed")
+        tg.send_message(chat_id, f"❌ {t['download_failed']}")
 
     finally:
+        if progress:
+            if leader:
+                progress_reporter.finish(progress)
+            else:
+                progress.remove_target(chat_id, message_id)
         try:
             if message_id:
-                bot.delete_message(chat_id, message_id)
-        except: pass
-        try:
-            if file_path and os.path.exists(file_path):
-                os.remove(file_path)
+                tg.delete_message(chat_id, message_id)
         except: pass
+        flights.release(flight)
+
+def run_queued_job(job):
+    # Налаштування беремо з задачі (на момент запиту) — лише для цієї задачі.
+    # Профіль у кеші процесу — з бази: знімок задачі може бути годинної давності.
+    # Створюємо його зі знімка, лише якщо профілю ще немає (лічильник завантажень)
+    user = job["user"]
+    if users.get(user["id"]) is None:
+        users.create(user["id"], user)
+    job_id = job.get("journal")
+    if job_id:
+        row = journal.start(job_id)
+        # Попередню спробу перервав перезапуск — її статус-повідомлення вже не оновиться
+        if row and row["message_id"]:
+            try:
+                tg.delete_message(job["chat_id"], row["message_id"])
+            except: pass
+    try:
+        if job.get("audio"):
+            run_audio_task(job["audio"], job["chat_id"], user, job["lang"])
+        else:
+            run_download_task(job["url"], job["chat_id"], user, job["lang"], job_id)
+    finally:
+        if job_id:
+            journal.finish(job_id)
+
+def drop_job(chat_id, payload):
+    # Задачу більше не виконуємо: запис у журналі закривається, користувач дізнається
+    job_id = payload.get("journal")
+    row = journal.get(job_id) if job_id else None
+    if row:
+        journal.finish(job_id)
+        if row["message_id"]:
+            try:
+                tg.delete_message(chat_id, row["message_id"])
+            except: pass
+    t = texts.get(payload.get("lang"), texts["uk"])
+    try:
+        tg.send_message(chat_id, f"❌ {t['download_failed']}")
+    except: pass
+
+# Задача — словник (url або audio); в одному процесі він не серіалізується
+if ROLE == "single":
+    download_pool = DownloadPool(
+        run_queued_job,
+        workers=DOWNLOAD_WORKERS,
+        queue_size=DOWNLOAD_QUEUE_SIZE,
+        per_chat=MAX_JOBS_PER_CHAT
+    )
+    download_pool.start()
+else:
+    download_pool = JobQueue(
+        os.path.join(DATA_DIR, "jobs.db"),
+        capacity=WORKER_PROCESSES * DOWNLOAD_WORKERS,
+        queue_size=DOWNLOAD_QUEUE_SIZE,
+        per_chat=MAX_JOBS_PER_CHAT,
+        stale_after=JOB_STALE_AFTER,
+        max_attempts=JOB_MAX_ATTEMPTS
+    )
+    if ROLE == "worker":
+        QueueWorker(download_pool, run_queued_job, threads=DOWNLOAD_WORKERS, on_dropped=drop_job).start()
+    else:
+        WorkerProcesses([sys.executable, os.path.abspath(__file__), "worker"], WORKER_PROCESSES).start()
+
+def warm_up(profiles):
+    # yt-dlp, регулярні вирази екстракторів і екземпляри YoutubeDL — у фоні,
+    # щоб вебхук відповідав одразу, а перша задача не чекала на них
+    try:
+        with STAGE_SECONDS.time(stage="warmup"):
+            ydl_pool.warm_up(profiles)
+    except Exception as e:
+        logging.error(f"WARM-UP ERROR: {e}")
+
+# Веб-процес з окремими воркерами сам нічого не качає: йому потрібні лише
+# регулярні вирази екстракторів (id відео для кешу file_id)
+if YDL_WARM_PROFILES:
+    threading.Thread(target=warm_up, args=([] if ROLE == "web" else YDL_WARM_PROFILES,),
+                     name="ydl-warmup", daemon=True).start()
+
+def jobs_in_flight():
+    stats = download_pool.stats()
+    return stats["pending"] + stats["running"]
+
+# Квоти і бюджет перевіряє процес, що приймає повідомлення; байти рахують усі процеси
+TIERS = {
+    "free": Tier("free", FREE_REQUESTS_PER_MIN, FREE_DAILY_BYTES, priority=DEFAULT_PRIORITY,
+                 budget_share=FREE_BUDGET_SHARE),
+    "premium": Tier("premium", PREMIUM_REQUESTS_PER_MIN, PREMIUM_DAILY_BYTES, priority=DEFAULT_PRIORITY - 1,
+                    budget_share=1.0),
+}
+admission = Admission(os.path.join(DATA_DIR, "usage.db"), TIERS, "free", ADMISSION_BUDGET, jobs_in_flight)
+
+def admit(chat_id, user, t, n=1):
+    # Пріоритет для черги або None, якщо користувачу вже відповіли відмовою
+    tier = admission.tier(user)
+    status, detail = admission.check(user, n)
+    ADMISSIONS.inc(tier=tier.name, result=status)
+    if status == ADMITTED:
+        return tier.priority
+    if status == RATE_LIMITED:
+        tg.send_message(chat_id, t["rate_limited"].format(seconds=detail))
+    elif status == OVER_QUOTA:
+        name = t["subscription_names"].get(tier.name, tier.name)
+        tg.send_message(chat_id, t["daily_quota"].format(limit=detail // (1024 * 1024), tier=name))
+    else:
+        tg.send_message(chat_id, t["queue_full"])
+    return None
+
+def submit_jobs(chat_id, payloads, priority=DEFAULT_PRIORITY):
+    # Спершу запис у журнал, щоб задача пережила перезапуск, поки чекає в черзі
+    ids = journal.add_many(chat_id, payloads)
+    for payload, job_id in zip(payloads, ids):
+        payload["journal"] = job_id
+    if ROLE == "single":
+        status, pos = download_pool.submit_many(chat_id, [(p,) for p in payloads], priority)
+    else:
+        status, pos = download_pool.submit_many(chat_id, payloads, priority)
+    if status != ACCEPTED:
+        journal.discard(ids)
+    return status, pos
+
+def resume_jobs():
+    # Задачі, перервані перезапуском, — знову в пул (у режимі з воркерами
+    # це робить сама SQLite-черга)
+    groups = {}
+    for row in journal.unfinished():
+        payload = dict(row["payload"], journal=row["id"])
+        if row["attempts"] >= JOB_MAX_ATTEMPTS:
+            logging.error(f"Journal job {row['id']} dropped after {row['attempts']} attempts")
+            drop_job(row["chat_id"], payload)
+            continue
+        groups.setdefault(row["chat_id"], []).append(payload)
+    # Задачі одного чату (усі посилання повідомлення) — разом, як при прийомі
+    resumed = 0
+    for chat_id, payloads in groups.items():
+        priority = min(admission.tier(p["user"]).priority for p in payloads)
+        status, _ = download_pool.submit_many(chat_id, [(p,) for p in payloads], priority)
+        if status == ACCEPTED:
+            resumed += len(payloads)
+            continue
+        logging.error(f"Journal jobs of chat {chat_id} not resumed: {status}")
+        for payload in payloads:
+            drop_job(chat_id, payload)
+    if resumed:
+        logging.info(f"Resumed {resumed} interrupted jobs")
+
+if ROLE == "single":
+    resume_jobs()
+
+def submit_downloads(urls, chat_id, user, lang, priority=DEFAULT_PRIORITY):
+    # Усі посилання повідомлення стають окремими задачами і качаються паралельно
+    return submit_jobs(
+        chat_id, [{"url": url, "chat_id": chat_id, "user": user, "lang": lang} for url in urls], priority
+    )
+
+def reply_submit_status(chat_id, t, status, pos):
+    if status == ACCEPTED:
+        if pos:
+            tg.send_message(chat_id, t["queued"].format(pos=pos))
+    elif status == QUEUE_FULL:
+        tg.send_message(chat_id, t["queue_full"])
+    else:
+        tg.send_message(chat_id, t["chat_limit"])
+
+metrics.gauge("dowlander_download_queue_depth", "Download jobs waiting for a worker",
+              lambda: download_pool.stats()["pending"])
+metrics.gauge("dowlander_download_workers_active", "Download workers running a job",
+              lambda: download_pool.stats()["running"])
+metrics.gauge("dowlander_download_workers", "Download workers configured",
+              lambda: download_pool.stats()["workers"])
+metrics.gauge("dowlander_shared_downloads_in_flight", "Distinct downloads currently in flight",
+              lambda: len(flights.flights))
+metrics.gauge("dowlander_spool_bytes", "Disk bytes reserved by running downloads plus stale leftovers",
+              spool.used)
+metrics.gauge("dowlander_cookie_jars_benched", "Cookie jars resting after a platform refused them",
+              lambda: cookie_pool.stats()["benched"])
 
 # ============================================================
 #                     CALLBACKS
@@ -276,26 +1266,40 @@ def callback(c):
     chat_id = c.message.chat.id
 
     if data == "cmd_back":
-        bot.send_message(chat_id, t["enter_url"], reply_markup=main_menu(user))
+        tg.send_message(chat_id, t["enter_url"], reply_markup=main_menu(user))
 
     elif data == "cmd_settings":
-        bot.edit_message_text(t["settings_title"], chat_id, c.message.message_id, reply_markup=settings_keyboard(user))
+        tg.edit_message_text(t["settings_title"], chat_id, c.message.message_id, reply_markup=settings_keyboard(user))
 
     elif data == "cmd_language":
-        bot.edit_message_text(t["language"], chat_id, c.message.message_id, reply_markup=language_keyboard())
+        tg.edit_message_text(t["language"], chat_id, c.message.message_id, reply_markup=language_keyboard())
 
     elif data.startswith("lang_"):
         lang = data.replace("lang_", "")
-        user["language"] = lang
-        bot.send_message(chat_id, texts[lang]["welcome"], reply_markup=main_menu(user))
+        users.update(user["id"], language=lang)
+        tg.send_message(chat_id, texts[lang]["welcome"], reply_markup=main_menu(user))
 
     elif data.startswith("format_"):
-        user["format"] = data.replace("format_", "")
-        bot.edit_message_reply_markup(chat_id, c.message.message_id, reply_markup=settings_keyboard(user))
+        users.update(user["id"], format=data.replace("format_", ""))
+        tg.edit_message_reply_markup(chat_id, c.message.message_id, reply_markup=settings_keyboard(user))
 
     elif data == "toggle_vpa":
-        user["video_plus_audio"] = not user["video_plus_audio"]
-        bot.edit_message_reply_markup(chat_id, c.message.message_id, reply_markup=settings_keyboard(user))
+        users.update(user["id"], video_plus_audio=not user["video_plus_audio"])
+        tg.edit_message_reply_markup(chat_id, c.message.message_id, reply_markup=settings_keyboard(user))
+
+    elif data == "toggle_albums":
+        users.update(user["id"], albums=not user["albums"])
+        tg.edit_message_reply_markup(chat_id, c.message.message_id, reply_markup=settings_keyboard(user))
+
+    elif data.startswith("audio:"):
+        # Аудіо витягується лише зараз, у звичайній черзі завантажень
+        tg.answer_callback_query(c.id, f"🎵 {t['stage_audio']}...")
+        priority = admit(chat_id, user, t)
+        if priority is None:
+            return
+        job = {"audio": data[len("audio:"):], "chat_id": chat_id, "user": user, "lang": user["language"]}
+        status, pos = submit_jobs(chat_id, [job], priority)
+        reply_submit_status(chat_id, t, status, pos)
 
 # ============================================================
 #                     MESSAGE HANDLER
@@ -305,7 +1309,7 @@ def callback(c):
 def start_handler(m):
     user = get_user(m.from_user)
     t = texts[user["language"]]
-    bot.send_message(m.chat.id, t["welcome"], reply_markup=main_menu(user))
+    tg.send_message(m.chat.id, t["welcome"], reply_markup=main_menu(user))
 
 @bot.message_handler(func=lambda m: True)
 def message_handler(m):
@@ -313,63 +1317,114 @@ def message_handler(m):
     t = texts[user["language"]]
     text = m.text or ""
 
-    if text.startswith("http"):
-        threading.Thread(
-            target=run_download_task,
-            args=(text, m.chat.id, user, user["language"]),
-            daemon=True
-        ).start()
+    urls = extract_urls(text, MAX_URLS_PER_MESSAGE)
+    # Повтори з кешу file_id — одразу, без квоти тарифу і без черги завантажень.
+    # id відео лише з самого посилання: короткі посилання розкриває вже воркер
+    albums = bool(user.get("albums"))
+    urls = [
+        url for url in urls
+        if not send_cached(m.chat.id, user, media_id_from_url(canonicalize(url, resolve=False, keep_playlist=albums)))
+    ]
+    if urls:
+        # Диск спулу зайнятий — не ставимо в чергу те, що все одно не влізе
+        if spool.full():
+            tg.send_message(m.chat.id, t["queue_full"])
+            return
+        # Квоти тарифу і загальне навантаження — до того, як задача потрапить у чергу
+        priority = admit(m.chat.id, user, t, len(urls))
+        if priority is None:
+            return
+        status, pos = submit_downloads(urls, m.chat.id, user, user["language"], priority)
+        reply_submit_status(m.chat.id, t, status, pos)
         return
 
     cmd = match_cmd(text)
 
     if cmd == "menu":
-        bot.send_message(m.chat.id, t["enter_url"], reply_markup=main_menu(user))
+        tg.send_message(m.chat.id, t["enter_url"], reply_markup=main_menu(user))
     elif cmd == "profile":
+        if ROLE == "web":
+            # Лічильник збільшують процеси-воркери, у кеші веб-процесу він застарілий
+            users.reload_field(user["id"], "videos_downloaded")
         msg = (
             f"👤 {t['profile_title']}\n"
             f"ID: `{m.from_user.id}`\n"
             f"{t['lbl_name']}: {user['name']}\n"
-            f"{t['lbl_subscription']}: {user['subscription']}\n"
+            f"{t['lbl_subscription']}: {t['subscription_names'].get(user['subscription'], user['subscription'])}\n"
             f"{t['lbl_downloaded']}: {user['videos_downloaded']}\n"
             f"{t['lbl_format']}: {user['format']}\n"
             f"{t['lbl_since']}: {user['joined']}"
         )
-        bot.send_message(m.chat.id, msg, parse_mode="Markdown", reply_markup=main_menu(user))
+        tg.send_message(m.chat.id, msg, parse_mode="Markdown", reply_markup=main_menu(user))
     elif cmd == "settings":
-        bot.send_message(m.chat.id, t["settings_title"], reply_markup=settings_keyboard(user))
+        tg.send_message(m.chat.id, t["settings_title"], reply_markup=settings_keyboard(user))
     elif cmd == "language":
-        bot.send_message(m.chat.id, t["language"], reply_markup=language_keyboard())
+        tg.send_message(m.chat.id, t["language"], reply_markup=language_keyboard())
     elif cmd == "subscription":
-        bot.send_message(m.chat.id, t["free_version"], reply_markup=main_menu(user))
+        tg.send_message(m.chat.id, t["free_version"], reply_markup=main_menu(user))
     elif cmd == "help":
-        bot.send_message(m.chat.id, t["help_text"], reply_markup=main_menu(user))
+        tg.send_message(m.chat.id, t["help_text"], reply_markup=main_menu(user))
     else:
-        bot.send_message(m.chat.id, t["not_understood"], reply_markup=main_menu(user))
+        tg.send_message(m.chat.id, t["not_understood"], reply_markup=main_menu(user))
 
 # ============================================================
 #                       WEBHOOK
 # ============================================================
 
+def process_updates(updates):
+    with STAGE_SECONDS.time(stage="dispatch"):
+        bot.process_new_updates(updates)
+
+dispatcher = UpdateDispatcher(
+    process_updates,
+    workers=DISPATCH_WORKERS,
+    queue_size=DISPATCH_QUEUE_SIZE
+)
+dispatcher.start()
+
+metrics.gauge("dowlander_update_queue_depth", "Updates waiting for a dispatcher thread", dispatcher.depth)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
 @app.route("/", methods=["GET"])
 def home():
     return "Bot is running!", 200
 
 @app.route(WEBHOOK_PATH, methods=["POST"])
 def webhook():
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        return "Forbidden", 403
     if request.headers.get("content-type") == "application/json":
         json_string = request.get_data().decode("utf-8")
-        update = types.Update.de_json(json_string)
-        bot.process_new_updates([update])
+        try:
+            update = types.Update.de_json(json_string)
+        except Exception as e:
+            logging.error(f"Bad update: {e}")
+            return "Bad Request", 400
+        # Обробка йде у фоні, Telegram отримує відповідь одразу
+        if dispatcher.submit(update) == BUSY:
+            return "Busy", 503
         return "OK", 200
     return "Forbidden", 403
 
 if __name__ == "__main__":
+    if ROLE == "worker":
+        # Процес-воркер: лише забирає задачі з черги, вебхук і Flask не потрібні
+        logging.info("🛠 Воркер завантажень запущено")
+        # Веб-процес, що нас запустив, зник — виходимо (задачі підбере наступний воркер)
+        parent = os.getppid()
+        while os.getppid() == parent:
+            time.sleep(1)
+        logging.warning("Web process is gone, worker exiting")
+        sys.exit(0)
+
     logging.info("🚀 Запуск Webhook")
     try:
         bot.delete_webhook()
         time.sleep(0.3)
-        bot.set_webhook(url=WEBHOOK_URL, drop_pending_updates=True)
+        bot.set_webhook(url=WEBHOOK_URL, drop_pending_updates=True, secret_token=WEBHOOK_SECRET)
         logging.info(f"✅ Webhook встановлено: {WEBHOOK_URL}")
     except Exception as e:
         logging.error(f"Webhook error: {e}")
@@ -0,0 +1,158 @@
+import logging
+import os
+import subprocess
+
+# ============================================================
+#                 ОБРОБКА МЕДІА (ffmpeg)
+# ============================================================
+
+FFMPEG_TIMEOUT = int(os.getenv("FFMPEG_TIMEOUT", 300))
+
+# Кодеки, які можна покласти в аудіофайл без перекодування: кодек -> розширення
+COPY_AUDIO = {"mp4a": "m4a", "aac": "m4a", "mp3": "mp3"}
+
+
+def audio_copy_ext(acodec):
+    for prefix, ext in COPY_AUDIO.items():
+        if (acodec or "").startswith(prefix):
+            return ext
+    return None
+
+
+def run_ffmpeg(args):
+    # Аргументи списком, без shell — імена файлів не потребують екранування
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", *args]
+    try:
+        res = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=FFMPEG_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logging.error(f"FFMPEG ERROR: {e}")
+        return False
+    if res.returncode != 0:
+        logging.error(f"FFMPEG ERROR: {res.stderr.decode(errors='ignore')[-300:]}")
+        return False
+    return True
+
+
+def extract_audio(src, acodec=None, dst_dir=None):
+    """Аудіо з відео: копія доріжки, якщо кодек дозволяє, інакше MP3.
+    Результат лягає поруч із src або в dst_dir."""
+    base = src.rsplit(".", 1)[0]
+    if dst_dir:
+        base = os.path.join(dst_dir, os.path.basename(base))
+    ext = audio_copy_ext(acodec)
+    if ext:
+        dst = f"{base}.{ext}"
+        if run_ffmpeg(["-i", src, "-vn", "-map", "0:a:0", "-c:a", "copy", dst]) and os.path.exists(dst):
+            return dst
+    dst = f"{base}.mp3"
+    if run_ffmpeg(["-i", src, "-vn", "-map", "0:a:0", "-c:a", "libmp3lame", "-q:a", "2", dst]) and os.path.exists(dst):
+        return dst
+    return None
+
+
+def split_merged_parts(info):
+    """Проміжні файли злиття (keepvideo): повертає (аудіо, решта)."""
+    audio, rest = None, []
+    for d in info.get("requested_downloads") or [info]:
+        for f in d.get("requested_formats") or []:
+            path = f.get("filepath")
+            if not path or not os.path.exists(path):
+                continue
+            if audio is None and f.get("vcodec") == "none" and f.get("ext") in ("m4a", "mp3"):
+                audio = path
+            else:
+                rest.append(path)
+    return audio, rest
+
+
+# ============================================================
+#          ВИБІР ФОРМАТУ ПІД ЛІМІТ РОЗМІРУ TELEGRAM
+# ============================================================
+
+# MP3 192 kbit/s: ~24 КБ на секунду
+MP3_BYTES_PER_SEC = 192 * 1000 // 8
+# Запас для наближених оцінок (filesize_approx, бітрейт × тривалість)
+APPROX_MARGIN = 1.1
+
+
+class TooLarge(Exception):
+    pass
+
+
+def estimate_size(f, duration):
+    if f.get("filesize"):
+        return f["filesize"]
+    if f.get("filesize_approx"):
+        return f["filesize_approx"] * APPROX_MARGIN
+    if f.get("tbr") and duration:
+        return f["tbr"] * 1000 / 8 * duration * APPROX_MARGIN
+    return None
+
+
+def has_video(f):
+    return f.get("vcodec") not in (None, "none")
+
+
+def has_audio(f):
+    return f.get("acodec") not in (None, "none")
+
+
+def pick_format(info, audio_only, budget, merge=True):
+    """Специфікація формату, що влазить у budget байт.
+
+    None — розміри невідомі, лишаємо стандартний вибір yt-dlp.
+    TooLarge — жодна комбінація не влазить.
+    """
+    duration = info.get("duration")
+    if audio_only:
+        # Розмір визначає MP3 після конвертації, а не вихідний потік
+        if duration and duration * MP3_BYTES_PER_SEC > budget:
+            raise TooLarge(f"{duration}s of audio")
+        return None
+
+    formats = info.get("formats") or []
+    audios = [f for f in formats if has_audio(f) and f.get("vcodec") == "none"]
+    candidates = []
+    for f in formats:
+        if not has_video(f):
+            continue
+        size = estimate_size(f, duration)
+        if has_audio(f):
+            candidates.append((f["format_id"], size, f, None))
+        elif merge and f.get("acodec") == "none":
+            for a in audios:
+                a_size = estimate_size(a, duration)
+                total = size + a_size if size is not None and a_size is not None else None
+                candidates.append((f"{f['format_id']}+{a['format_id']}", total, f, a))
+
+    known = [c for c in candidates if c[1] is not None]
+    if not known:
+        return None
+    fitting = [c for c in known if c[1] <= budget]
+    if not fitting:
+        raise TooLarge(f"smallest is {min(c[1] for c in known):.0f} bytes")
+
+    def score(c):
+        _, size, v, a = c
+        mp4 = v.get("ext") == "mp4" and (a is None or a.get("ext") == "m4a")
+        return (mp4, v.get("height") or 0, (v.get("tbr") or 0) + ((a or {}).get("tbr") or 0), -size)
+
+    return max(fitting, key=score)[0]
+
+
+def expected_size(info, spec, audio_only):
+    """Оцінка розміру результату для обраної специфікації (None — невідомо)."""
+    duration = info.get("duration")
+    if audio_only:
+        return duration * MP3_BYTES_PER_SEC if duration else None
+    if not spec:
+        return None
+    formats = {f.get("format_id"): f for f in info.get("formats") or []}
+    total = 0
+    for format_id in spec.split("+"):
+        f = formats.get(format_id)
+        size = estimate_size(f, duration) if f else None
+        if size is None:
+            return None
+        total += size
+    return total
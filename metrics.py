@@ -0,0 +1,126 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# ============================================================
+#            МЕТРИКИ У ФОРМАТІ PROMETHEUS (/metrics)
+# ============================================================
+# Лічильники, гістограми і гейджі без зовнішніх залежностей.
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, n=1, **labels):
+        key = tuple(labels.get(l, "") for l in self.label_names)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.label_names, key)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}   # labels -> [лічильники по бакетах..., сума, кількість]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(l, "") for l in self.label_names)
+        with self.lock:
+            v = self.values.get(key)
+            if v is None:
+                v = self.values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            items = [(k, list(v)) for k, v in self.values.items()]
+        for key, v in items:
+            for bound, count in zip(self.buckets, v):
+                yield f"{self.name}_bucket{_labels(self.label_names + ('le',), key + (bound,))} {count}"
+            yield f"{self.name}_bucket{_labels(self.label_names + ('le',), key + ('+Inf',))} {v[-1]}"
+            yield f"{self.name}_sum{_labels(self.label_names, key)} {v[-2]}"
+            yield f"{self.name}_count{_labels(self.label_names, key)} {v[-1]}"
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def samples(self):
+        yield f"{self.name} {self.fn()}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn):
+        return self._add(Gauge(name, help, fn))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for m in self.metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+
+from telebot import apihelper
+
+from metrics import registry as metrics
+
+# ============================================================
+#         ПЛАНУВАЛЬНИК ВИХІДНИХ ЗАПИТІВ ДО TELEGRAM
+# ============================================================
+# Token bucket на кожен чат і глобально, повтор після 429 через retry_after,
+# пріоритети: меню і статуси не чекають за великими аплоадами медіа.
+
+HIGH = 0      # відповіді на команди, меню, статуси
+NORMAL = 1    # оновлення прогресу
+LOW = 2       # аплоад медіа
+
+MEDIA_METHODS = {
+    "send_video", "send_audio", "send_document", "send_photo", "send_media_group", "send_animation", "send_voice"
+}
+
+THROTTLED = metrics.counter(
+    "dowlander_telegram_throttled_total", "Telegram 429 responses retried by the outbox", ["method"]
+)
+
+# У edit_message_text / edit_message_caption chat_id — другий аргумент
+CHAT_ARG = {"edit_message_text": 1, "edit_message_caption": 1}
+
+# Виклики, не прив'язані до чату: лише глобальний ліміт
+NO_CHAT = {"get_file", "answer_callback_query"}
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def delay(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+def retry_after(e):
+    if isinstance(e, apihelper.ApiTelegramException) and e.error_code == 429:
+        params = (e.result_json or {}).get("parameters") or {}
+        return params.get("retry_after", 1)
+    return None
+
+
+class Outbox:
+    def __init__(self, bot, global_rate=30, chat_rate=1.0, chat_burst=3, upload_slots=4, max_retries=3):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.cond = threading.Condition()
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chats = {}            # chat_id -> TokenBucket
+        self.paused = {}           # chat_id -> до якого моменту чекати після 429
+        self.waiting = [0, 0, 0]   # очікувачі за пріоритетом
+        self.chat_waiting = {}     # (chat_id, пріоритет) -> кількість
+        self.uploads = threading.Semaphore(upload_slots)
+
+    def __getattr__(self, method):
+        # tg.send_message(chat_id, ...) -> виклик bot.send_message через чергу
+        def call(*args, priority=None, **kwargs):
+            i = CHAT_ARG.get(method, 0)
+            if method in NO_CHAT:
+                chat_id = None
+            else:
+                chat_id = args[i] if len(args) > i else kwargs.get("chat_id")
+            if priority is None:
+                priority = LOW if method in MEDIA_METHODS else HIGH
+            return self.call(method, chat_id, priority, *args, **kwargs)
+        return call
+
+    def call(self, method, chat_id, priority, *args, **kwargs):
+        fn = getattr(self.bot, method)
+        positions = _file_positions(args, kwargs)
+        for attempt in range(self.max_retries + 1):
+            self._acquire(chat_id, priority)
+            try:
+                if priority == LOW:
+                    with self.uploads:
+                        return fn(*args, **kwargs)
+                return fn(*args, **kwargs)
+            except apihelper.ApiTelegramException as e:
+                wait = retry_after(e)
+                if wait is None or attempt == self.max_retries:
+                    raise
+                logging.warning(f"429 on {method} for {chat_id}, retry after {wait}s")
+                THROTTLED.inc(method=method)
+                with self.cond:
+                    self.paused[chat_id] = time.monotonic() + wait
+                    self.cond.notify_all()
+                # Файл уже частково прочитано — повертаємось на початок
+                for f, pos in positions:
+                    f.seek(pos)
+
+    def try_call(self, method, chat_id, priority, *args, **kwargs):
+        # Один виклик без очікування — для того, що можна пропустити (прогрес).
+        # False, якщо чат чи глобальний ліміт зараз не дозволяє; 429 лише ставить чат на паузу
+        with self.cond:
+            if self._take(chat_id, priority):
+                return False
+        try:
+            getattr(self.bot, method)(*args, **kwargs)
+        except apihelper.ApiTelegramException as e:
+            wait = retry_after(e)
+            if wait is None:
+                raise
+            logging.warning(f"429 on {method} for {chat_id}, skipped, paused for {wait}s")
+            THROTTLED.inc(method=method)
+            with self.cond:
+                self.paused[chat_id] = time.monotonic() + wait
+                self.cond.notify_all()
+            return False
+        return True
+
+    def _acquire(self, chat_id, priority):
+        with self.cond:
+            self.waiting[priority] += 1
+            key = (chat_id, priority)
+            self.chat_waiting[key] = self.chat_waiting.get(key, 0) + 1
+            try:
+                while True:
+                    wait = self._take(chat_id, priority)
+                    if not wait:
+                        return
+                    self.cond.wait(wait)
+            finally:
+                self.waiting[priority] -= 1
+                left = self.chat_waiting[key] - 1
+                if left:
+                    self.chat_waiting[key] = left
+                else:
+                    del self.chat_waiting[key]
+                self.cond.notify_all()
+
+    def _take(self, chat_id, priority):
+        # Під self.cond. 0 — токени взято, інакше скільки почекати до наступної спроби
+        now = time.monotonic()
+        bucket = self._bucket(chat_id)
+        chat_delay = max(bucket.delay(now) if bucket else 0, self.paused.get(chat_id, 0) - now)
+        global_delay = self.global_bucket.delay(now)
+        # Поступаємось вищому пріоритету в цьому ж чаті,
+        # а за глобальний ліміт — вищому пріоритету будь-де
+        yield_chat = any(self.chat_waiting.get((chat_id, p)) for p in range(priority))
+        yield_global = global_delay > 0 and any(self.waiting[p] for p in range(priority))
+        if not yield_chat and not yield_global and chat_delay <= 0 and global_delay <= 0:
+            self.global_bucket.take()
+            if bucket:
+                bucket.take()
+            return 0
+        delays = [d for d in (chat_delay, global_delay) if d > 0]
+        return min(delays) if delays else 0.5
+
+    def _bucket(self, chat_id):
+        if chat_id is None:
+            return None
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if len(self.chats) > 10000:
+                self._prune()
+            bucket = self.chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _prune(self):
+        # Повні відра неактивних чатів нічого не обмежують — прибираємо
+        now = time.monotonic()
+        for chat_id, bucket in list(self.chats.items()):
+            if now - bucket.last > 60:
+                del self.chats[chat_id]
+        for chat_id, until in list(self.paused.items()):
+            if until < now:
+                del self.paused[chat_id]
+
+
+def _file_positions(args, kwargs):
+    positions = []
+    values = []
+    for value in list(args) + list(kwargs.values()):
+        # send_media_group: файли всередині списку InputMedia
+        if isinstance(value, (list, tuple)):
+            values.extend(getattr(item, "media", None) for item in value)
+        else:
+            values.append(value)
+    for value in values:
+        if hasattr(value, "seek") and hasattr(value, "tell"):
+            try:
+                positions.append((value, value.tell()))
+            except (OSError, ValueError):
+                pass
+    return positions
@@ -0,0 +1,109 @@
+import shutil
+
+# ============================================================
+#          ПРОФІЛІ ЗАВАНТАЖЕННЯ ЗА ЕКСТРАКТОРОМ
+# ============================================================
+# Параметри мережі yt-dlp для кожної платформи окремо: скільки фрагментів
+# HLS/DASH качати одночасно, розмір HTTP-чанка, повтори, таймаут сокета і
+# порядок форматів. Профіль обирається за ключем екстрактора (ie_key);
+# невідомі платформи отримують "default".
+#
+# Прогресивний файл (один mp4) yt-dlp сам качає одним з'єднанням. Якщо в
+# системі є aria2c, такі файли йдуть через нього кількома Range-з'єднаннями
+# (range_connections); без aria2c лишається звичайне завантаження чанками.
+
+MB = 1024 * 1024
+DEFAULT = "default"
+
+PROFILES = {
+    DEFAULT: {
+        "concurrent_fragment_downloads": 4,
+        "http_chunk_size": None,
+        "retries": 3,
+        "fragment_retries": 5,
+        "socket_timeout": 20,
+        "range_connections": 4,
+    },
+    # DASH/HLS з десятками фрагментів; великі progressive-потоки YouTube
+    # гальмує без Range-чанків
+    "Youtube": {
+        "concurrent_fragment_downloads": 8,
+        "http_chunk_size": 10 * MB,
+        "retries": 5,
+        "fragment_retries": 10,
+        "socket_timeout": 15,
+        "format_sort": ["vcodec:h264", "acodec:aac", "ext:mp4:m4a"],
+        "range_connections": 8,
+    },
+    # Reels — DASH з короткими фрагментами
+    "Instagram": {
+        "concurrent_fragment_downloads": 6,
+        "http_chunk_size": None,
+        "retries": 5,
+        "fragment_retries": 10,
+        "socket_timeout": 15,
+        "format_sort": ["vcodec:h264", "ext:mp4:m4a"],
+        "range_connections": 4,
+    },
+    # Невеликі progressive mp4; CDN часто рве з'єднання — більше повторів
+    "TikTok": {
+        "concurrent_fragment_downloads": 1,
+        "http_chunk_size": None,
+        "retries": 8,
+        "fragment_retries": 5,
+        "socket_timeout": 10,
+        "format_sort": ["vcodec:h264"],
+        "range_connections": 2,
+    },
+    "Facebook": {
+        "concurrent_fragment_downloads": 4,
+        "http_chunk_size": None,
+        "retries": 5,
+        "fragment_retries": 10,
+        "socket_timeout": 20,
+        "format_sort": ["vcodec:h264", "ext:mp4:m4a"],
+        "range_connections": 4,
+    },
+    # Будь-який сайт з прямим посиланням або HLS-плейлистом
+    "Generic": {
+        "concurrent_fragment_downloads": 6,
+        "http_chunk_size": None,
+        "retries": 3,
+        "fragment_retries": 10,
+        "socket_timeout": 30,
+        "range_connections": 4,
+    },
+}
+
+
+def profile_name(ie_key):
+    return ie_key if ie_key in PROFILES else DEFAULT
+
+
+def ydl_options(ie_key, range_connections=None):
+    """Опції yt-dlp з профілю платформи (новий словник — його можна доповнювати).
+
+    range_connections: None — як у профілі, 0 — без aria2c.
+    """
+    opts = {k: v for k, v in PROFILES[profile_name(ie_key)].items() if v is not None}
+    connections = opts.pop("range_connections", 0)
+    if range_connections is not None:
+        connections = min(connections, range_connections)
+    if connections > 1 and aria2c_available():
+        # Лише для http(s): фрагменти HLS/DASH качає сам yt-dlp
+        opts["external_downloader"] = {"http": "aria2c"}
+        opts["external_downloader_args"] = {"aria2c": [
+            "-x", str(connections), "-s", str(connections), "-k", "1M",
+            "--timeout", str(opts.get("socket_timeout", 20)),
+        ]}
+    return opts
+
+
+_aria2c = None
+
+
+def aria2c_available():
+    global _aria2c
+    if _aria2c is None:
+        _aria2c = shutil.which("aria2c") is not None
+    return _aria2c
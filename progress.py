@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+
+from outbox import NORMAL
+
+# ============================================================
+#             ПРОГРЕС ЗАВАНТАЖЕННЯ В СТАТУС-ПОВІДОМЛЕННІ
+# ============================================================
+# Хуки yt-dlp лише оновлюють стан у пам'яті. Один фоновий потік редагує
+# статус-повідомлення, і тільки якщо текст змінився: не частіше ніж раз на
+# інтервал на чат (кілька задач чату — по черзі). Редагування не чекає на
+# ліміт чату: немає токена або чат на паузі після 429 — пропуск до наступного
+# такту, щоб один чат не затримував прогрес інших.
+
+DOWNLOAD = "download"
+MERGE = "merge"
+AUDIO = "audio"
+UPLOAD = "upload"
+
+# Постпроцесори yt-dlp -> етап
+PP_STAGES = {"Merger": MERGE, "FFmpegMerger": MERGE, "ExtractAudio": AUDIO, "FFmpegExtractAudio": AUDIO}
+
+
+def human_speed(bps):
+    if not bps:
+        return ""
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if bps < 1024:
+            return f"{bps:.0f} {unit}"
+        bps /= 1024
+    return f"{bps:.1f} GB/s"
+
+
+class Progress:
+    def __init__(self, chat_id, message_id, t):
+        self.lock = threading.Lock()
+        self.targets = [(chat_id, message_id, t)]
+        self.stage = DOWNLOAD
+        self.percent = None
+        self.speed = None
+        self.last_sent = {}   # (chat_id, message_id) -> текст
+        self.edited = {}      # (chat_id, message_id) -> час останнього редагування
+
+    def add_target(self, chat_id, message_id, t):
+        with self.lock:
+            self.targets.append((chat_id, message_id, t))
+
+    def remove_target(self, chat_id, message_id):
+        with self.lock:
+            self.targets = [x for x in self.targets if x[:2] != (chat_id, message_id)]
+
+    def hook(self, d):
+        # progress_hooks yt-dlp
+        if d.get("status") != "downloading":
+            return
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        if total:
+            percent = d.get("downloaded_bytes", 0) * 100 / total
+        elif d.get("fragment_count"):
+            percent = (d.get("fragment_index") or 0) * 100 / d["fragment_count"]
+        else:
+            percent = None
+        with self.lock:
+            self.stage = DOWNLOAD
+            self.percent = percent
+            self.speed = d.get("speed")
+
+    def pp_hook(self, d):
+        # postprocessor_hooks yt-dlp
+        stage = PP_STAGES.get(d.get("postprocessor"))
+        if stage and d.get("status") == "started":
+            self.set_stage(stage)
+
+    def set_stage(self, stage):
+        with self.lock:
+            self.stage = stage
+            self.percent = None
+            self.speed = None
+
+    def render(self, t):
+        text = f"⏳ {t['stage_' + self.stage]}"
+        if self.percent is not None:
+            text += f" {min(self.percent, 100):.0f}%"
+        if self.speed:
+            text += f" · {human_speed(self.speed)}"
+        return text
+
+
+class ProgressReporter:
+    def __init__(self, tg, interval=3.0):
+        self.tg = tg
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.jobs = set()
+        self.next_edit = {}   # chat_id -> не раніше якого моменту наступне редагування
+        threading.Thread(target=self._loop, name="progress", daemon=True).start()
+
+    def start(self, chat_id, message_id, t):
+        progress = Progress(chat_id, message_id, t)
+        with self.lock:
+            self.jobs.add(progress)
+        return progress
+
+    def finish(self, progress):
+        with self.lock:
+            self.jobs.discard(progress)
+
+    def _loop(self):
+        while True:
+            time.sleep(min(1.0, self.interval))
+            now = time.monotonic()
+            self.next_edit = {c: d for c, d in self.next_edit.items() if d > now}
+            for chat_id, (progress, message_id, text) in self._pending().items():
+                if chat_id not in self.next_edit:
+                    self._edit(progress, chat_id, message_id, text, now)
+
+    def _pending(self):
+        # chat_id -> одне редагування: статус, який найдовше не оновлювався
+        with self.lock:
+            jobs = list(self.jobs)
+        pending = {}
+        for progress in jobs:
+            with progress.lock:
+                for chat_id, message_id, t in progress.targets:
+                    text = progress.render(t)
+                    key = (chat_id, message_id)
+                    # Нічого не змінилось — не витрачаємо ліміт редагувань
+                    if progress.last_sent.get(key) == text:
+                        continue
+                    other = pending.get(chat_id)
+                    if other is None or progress.edited.get(key, 0) < other[0].edited.get((chat_id, other[1]), 0):
+                        pending[chat_id] = (progress, message_id, text)
+        return pending
+
+    def _edit(self, progress, chat_id, message_id, text, now):
+        try:
+            if not self.tg.try_call("edit_message_text", chat_id, NORMAL, text, chat_id, message_id):
+                return
+        except Exception as e:
+            logging.debug(f"Progress edit skipped: {e}")
+        with progress.lock:
+            progress.last_sent[(chat_id, message_id)] = text
+            progress.edited[(chat_id, message_id)] = now
+        self.next_edit[chat_id] = now + self.interval
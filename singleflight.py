@@ -0,0 +1,60 @@
+import logging
+import threading
+
+# ============================================================
+#        SINGLE-FLIGHT: ОДНЕ ЗАВАНТАЖЕННЯ НА ОДНАКОВІ ЗАПИТИ
+# ============================================================
+# Перший запит (лідер) качає файл, решта чекає на той самий результат.
+# Файли видаляються, коли їх відпустить останній учасник.
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.refs = 1
+        # Аплоади йдуть по черзі: після першого вдалого решта бере file_id
+        self.upload_lock = threading.Lock()
+        self.entry = None
+        # Прогрес лідера: учасники додають до нього свої статус-повідомлення
+        self.progress = None
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class SingleFlight:
+    def __init__(self, cleanup):
+        self.cleanup = cleanup
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def join(self, key):
+        """Повертає (flight, True якщо викликач — лідер)."""
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight:
+                flight.refs += 1
+                return flight, False
+            flight = Flight()
+            self.flights[key] = flight
+            return flight, True
+
+    def finish(self, key, flight, result=None, error=None):
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+            flight.result = result
+            flight.error = error
+        flight.done.set()
+
+    def release(self, flight):
+        with self.lock:
+            flight.refs -= 1
+            last = flight.refs == 0
+        if last and flight.result is not None:
+            try:
+                self.cleanup(flight.result)
+            except Exception as e:
+                logging.error(f"FLIGHT CLEANUP ERROR: {e}")
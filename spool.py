@@ -0,0 +1,266 @@
+import itertools
+import logging
+import os
+import shutil
+import threading
+import time
+
+# ============================================================
+#       СПУЛ ЗАВАНТАЖЕНЬ: КАТАЛОГ НА ЗАДАЧУ, КВОТА, ПРИБИРАННЯ
+# ============================================================
+# Кожна задача качає у власний каталог <pid>-<n>-<час>, який видаляється
+# цілком (разом з .part, .fNNN і витягнутим аудіо). Місце резервується
+# наперед за оцінкою розміру; фоновий прибиральник видаляє каталоги
+# процесів, що впали, і все, що пережило SPOOL_MAX_AGE. Каталоги з keep()
+# (незавершені задачі з журналу) лишаються — їх підхопить adopt().
+
+# На диску одночасно лежать вихідні потоки і результат злиття/екстракції
+OVERHEAD = 2
+
+
+class SpoolFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, path, reserved, tmpfs):
+        self.path = path
+        self.reserved = reserved
+        self.tmpfs = tmpfs
+        self.created = time.time()
+        self.release_at = None   # відкладене видалення (retain)
+
+
+class Spool:
+    def __init__(self, root, quota, default_reserve, tmpfs_root=None, tmpfs_max_file=0, tmpfs_quota=0,
+                 max_age=6 * 3600, sweep_interval=600, keep=None):
+        self.root = root
+        self.quota = quota
+        self.default_reserve = default_reserve
+        self.tmpfs_root = tmpfs_root
+        self.tmpfs_max_file = tmpfs_max_file
+        self.tmpfs_quota = tmpfs_quota
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self.keep = keep         # () -> множина каталогів, які не можна прибирати
+        self.lock = threading.Lock()
+        self.jobs = {}           # шлях -> Job
+        self.reserved = 0
+        self.tmpfs_reserved = 0
+        self.orphan_bytes = 0    # що лишилось на диску від чужих/старих задач
+        self.seq = itertools.count(1)
+        for path in self._roots():
+            os.makedirs(path, exist_ok=True)
+
+    def start(self):
+        self.sweep()
+        threading.Thread(target=self._loop, name="spool-sweeper", daemon=True).start()
+
+    # ---------------- Квота ----------------
+
+    def used(self):
+        with self.lock:
+            return self.reserved + self.orphan_bytes
+
+    def full(self):
+        """Чи варто взагалі приймати нові завантаження."""
+        return self.used() + self.default_reserve > self.quota or _free(self.root) < self.default_reserve
+
+    def job(self, estimate=None):
+        """Резервує місце і створює каталог задачі; SpoolFull, якщо не влазить."""
+        need = int((estimate or self.default_reserve) * OVERHEAD)
+        with self.lock:
+            tmpfs = bool(
+                self.tmpfs_root and estimate and estimate <= self.tmpfs_max_file
+                and self.tmpfs_reserved + need <= self.tmpfs_quota
+            )
+            root = self.tmpfs_root if tmpfs else self.root
+            path = os.path.join(root, f"{os.getpid()}-{next(self.seq)}-{int(time.time())}")
+            job = self._reserve(path, need, tmpfs)
+        os.makedirs(path, exist_ok=True)
+        return job
+
+    def adopt(self, path, estimate=None):
+        """Каталог перерваної задачі (після перезапуску) знову стає задачею цього процесу."""
+        need = int((estimate or self.default_reserve) * OVERHEAD)
+        tmpfs = bool(self.tmpfs_root) and os.path.dirname(path) == self.tmpfs_root
+        with self.lock:
+            if path in self.jobs:
+                raise SpoolFull(f"{path} is already in use")
+            # Уже скачане лежить на диску і враховане в orphan_bytes
+            self.orphan_bytes = max(0, self.orphan_bytes - _size(path))
+            return self._reserve(path, need, tmpfs)
+
+    def _reserve(self, path, need, tmpfs):
+        if not tmpfs and (self.reserved + self.orphan_bytes + need > self.quota or _free(self.root) < need):
+            raise SpoolFull(f"need {need} bytes, {self.reserved + self.orphan_bytes} of {self.quota} in use")
+        job = Job(path, need, tmpfs)
+        self.jobs[path] = job
+        if tmpfs:
+            self.tmpfs_reserved += need
+        else:
+            self.reserved += need
+        return job
+
+    def release(self, job):
+        if job is None:
+            return
+        with self.lock:
+            if self.jobs.pop(job.path, None) is None:
+                return
+            if job.tmpfs:
+                self.tmpfs_reserved -= job.reserved
+            else:
+                self.reserved -= job.reserved
+        shutil.rmtree(job.path, ignore_errors=True)
+
+    def retain(self, job, seconds):
+        """Лишає готові файли задачі ще на seconds; резерв зменшується до фактичного розміру."""
+        size = _size(job.path)
+        with self.lock:
+            if job.path not in self.jobs:
+                return
+            if job.tmpfs:
+                self.tmpfs_reserved += size - job.reserved
+            else:
+                self.reserved += size - job.reserved
+            job.reserved = size
+            job.release_at = time.time() + seconds
+
+    def release_due(self):
+        now = time.time()
+        with self.lock:
+            due = [job for job in self.jobs.values() if job.release_at and job.release_at <= now]
+        for job in due:
+            self.release(job)
+
+    # ---------------- Прибирання ----------------
+
+    def sweep(self):
+        now = time.time()
+        removed, left = 0, 0
+        with self.lock:
+            active = dict(self.jobs)
+        keep = self._kept()
+        for root in self._roots():
+            try:
+                names = os.listdir(root)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(root, name)
+                job = active.get(path)
+                if job:
+                    if now - job.created > self.max_age:
+                        logging.warning(f"Spool job expired, removing: {path}")
+                        self.release(job)
+                        removed += 1
+                    continue
+                if path in keep and now - _mtime(path) <= self.max_age:
+                    left += _size(path) if root == self.root else 0
+                    continue
+                if self._orphaned(name, path, now):
+                    _remove(path)
+                    removed += 1
+                elif root == self.root:
+                    left += _size(path)
+        with self.lock:
+            self.orphan_bytes = left
+        if removed:
+            logging.info(f"Spool sweep removed {removed} stale entries")
+        return removed
+
+    def _orphaned(self, name, path, now):
+        try:
+            age = now - os.path.getmtime(path)
+        except OSError:
+            return False
+        if age > self.max_age:
+            return True
+        pid = name.split("-", 1)[0]
+        if not pid.isdigit() or not os.path.isdir(path):
+            # Файли старого формату (без каталогу задачі) нікому не належать
+            return True
+        pid = int(pid)
+        if pid == os.getpid():
+            # Свій каталог, якого немає серед активних (задачу могли створити після знімка)
+            with self.lock:
+                return path not in self.jobs
+        return not _alive(pid)
+
+    def _loop(self):
+        # Відкладені видалення перевіряються щохвилини, повне прибирання — рідше
+        tick = min(60, self.sweep_interval)
+        last_sweep = time.monotonic()
+        while True:
+            time.sleep(tick)
+            try:
+                self.release_due()
+                if time.monotonic() - last_sweep >= self.sweep_interval:
+                    last_sweep = time.monotonic()
+                    self.sweep()
+            except Exception as e:
+                logging.error(f"SPOOL SWEEP ERROR: {e}")
+
+    def _kept(self):
+        if not self.keep:
+            return set()
+        try:
+            return set(self.keep())
+        except Exception as e:
+            # Без списку перервані задачі просто почнуть з нуля
+            logging.error(f"SPOOL KEEP ERROR: {e}")
+            return set()
+
+    def _roots(self):
+        return [r for r in (self.root, self.tmpfs_root) if r]
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+def _free(path):
+    try:
+        return shutil.disk_usage(path).free
+    except OSError:
+        return 0
+
+
+def _size(path):
+    if not os.path.isdir(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, f))
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
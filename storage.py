@@ -0,0 +1,147 @@
+import atexit
+import logging
+import sqlite3
+import threading
+
+# ============================================================
+#            ЗБЕРЕЖЕННЯ КОРИСТУВАЧІВ (SQLite, WAL)
+# ============================================================
+# Читання — зі словника в пам'яті (O(1), без диска на кожне повідомлення).
+# Запис — відкладений: зміни накопичуються і пишуться пачкою раз на кілька секунд.
+# Лічильники пишуться як "+N", тому кілька процесів не затирають один одного.
+
+FIELDS = ("name", "subscription", "videos_downloaded", "joined", "language", "format", "video_plus_audio", "albums")
+BOOL_FIELDS = ("video_plus_audio", "albums")
+
+# Значення полів, яких немає в профілі (наприклад, у задачах, поставлених до оновлення)
+DEFAULTS = {
+    "name": "User", "subscription": "free", "videos_downloaded": 0, "joined": None,
+    "language": "uk", "format": "mp4", "video_plus_audio": False, "albums": False,
+}
+
+# Колонки, додані пізніше: старі бази доповнюються при старті
+ADDED_COLUMNS = {"albums": "INTEGER DEFAULT 0"}
+
+
+class UserStore:
+    def __init__(self, path, flush_interval=2.0):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()      # кеш і черга змін
+        self.db_lock = threading.Lock()   # з'єднання з базою
+        self.cache = {}
+        self.new = {}      # uid -> початковий профіль (INSERT)
+        self.dirty = {}    # uid -> {поле: значення} (UPDATE ... SET)
+        self.deltas = {}   # uid -> {поле: приріст} (UPDATE ... SET поле = поле + N)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "id TEXT PRIMARY KEY, name TEXT, subscription TEXT, videos_downloaded INTEGER DEFAULT 0, "
+            "joined TEXT, language TEXT, format TEXT, video_plus_audio INTEGER, albums INTEGER DEFAULT 0)"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(users)")}
+        for name, decl in ADDED_COLUMNS.items():
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE users ADD COLUMN {name} {decl}")
+        self.conn.commit()
+
+        self.stopped = threading.Event()
+        threading.Thread(target=self._flusher, name="user-flush", daemon=True).start()
+        atexit.register(self.close)
+
+    def get(self, uid):
+        user = self.cache.get(uid)
+        if user is not None:
+            return user
+        with self.db_lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM users WHERE id = ?", (uid,)
+            ).fetchone()
+        if not row:
+            return None
+        user = dict(zip(FIELDS, row))
+        for f in BOOL_FIELDS:
+            user[f] = bool(user[f])
+        user["id"] = uid
+        with self.lock:
+            # Інший потік міг встигнути завантажити профіль раніше
+            return self.cache.setdefault(uid, user)
+
+    def create(self, uid, profile):
+        with self.lock:
+            if uid in self.cache:
+                return self.cache[uid]
+            profile = {**DEFAULTS, **profile}
+            user = dict(profile, id=uid)
+            self.cache[uid] = user
+            self.new[uid] = profile
+            return user
+
+    def update(self, uid, **fields):
+        with self.lock:
+            self.cache[uid].update(fields)
+            self.dirty.setdefault(uid, {}).update(fields)
+
+    def incr(self, uid, field, n=1):
+        with self.lock:
+            self.cache[uid][field] += n
+            d = self.deltas.setdefault(uid, {})
+            d[field] = d.get(field, 0) + n
+
+    def reload_field(self, uid, field):
+        """Свіже значення з бази (плюс ще не записаний приріст): його змінюють і інші процеси."""
+        if field not in FIELDS:
+            raise ValueError(field)
+        with self.db_lock:
+            row = self.conn.execute(f"SELECT {field} FROM users WHERE id = ?", (uid,)).fetchone()
+        with self.lock:
+            if row is None or uid not in self.cache:
+                return self.cache.get(uid, {}).get(field)
+            value = row[0] + self.deltas.get(uid, {}).get(field, 0)
+            self.cache[uid][field] = value
+            return value
+
+    def flush(self):
+        with self.lock:
+            new, dirty, deltas = self.new, self.dirty, self.deltas
+            self.new, self.dirty, self.deltas = {}, {}, {}
+        if not (new or dirty or deltas):
+            return
+        try:
+            with self.db_lock, self.conn:
+                self.conn.executemany(
+                    f"INSERT OR IGNORE INTO users (id, {', '.join(FIELDS)}) VALUES (?{', ?' * len(FIELDS)})",
+                    [(uid,) + tuple(p[f] for f in FIELDS) for uid, p in new.items()]
+                )
+                for uid, fields in dirty.items():
+                    cols = ", ".join(f"{f} = ?" for f in fields)
+                    self.conn.execute(f"UPDATE users SET {cols} WHERE id = ?", (*fields.values(), uid))
+                for uid, fields in deltas.items():
+                    cols = ", ".join(f"{f} = {f} + ?" for f in fields)
+                    self.conn.execute(f"UPDATE users SET {cols} WHERE id = ?", (*fields.values(), uid))
+        except sqlite3.Error as e:
+            logging.error(f"USER FLUSH ERROR: {e}")
+            # Повертаємо зміни в чергу, новіші значення мають пріоритет
+            with self.lock:
+                for uid, p in new.items():
+                    self.new.setdefault(uid, p)
+                for uid, fields in dirty.items():
+                    self.dirty[uid] = {**fields, **self.dirty.get(uid, {})}
+                for uid, fields in deltas.items():
+                    d = self.deltas.setdefault(uid, {})
+                    for f, n in fields.items():
+                        d[f] = d.get(f, 0) + n
+
+    def close(self):
+        self.stopped.set()
+        self.flush()
+
+    def _flusher(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                # Потік запису не має зупинятись через один поганий запис
+                logging.error(f"USER FLUSH ERROR: {e}")
@@ -0,0 +1,199 @@
+import io
+import logging
+import os
+import random
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from metrics import registry as metrics
+
+# ============================================================
+#        ТРАНСПОРТ ДЛЯ BOT API (apihelper.CUSTOM_REQUEST_SENDER)
+# ============================================================
+# Файли відправляються потоком з диска шматками, тіло запиту не збирається
+# в пам'яті. Одна сесія з пулом keep-alive з'єднань на всі потоки.
+# Окремі таймаути на з'єднання, відповідь і аплоад; мережеві збої і 5xx
+# повторюються з випадковою паузою, але лише там, де повтор нічого не зламає.
+
+# Повторний виклик не створить дубль у чаті
+IDEMPOTENT = {
+    "getMe", "getFile", "getChat", "getChatMember", "getWebhookInfo", "setWebhook", "deleteWebhook",
+    "editMessageText", "editMessageCaption", "editMessageReplyMarkup", "deleteMessage", "answerCallbackQuery"
+}
+RETRY_STATUS = {500, 502, 503, 504}
+
+REQUEST_SECONDS = metrics.histogram(
+    "dowlander_telegram_request_seconds", "Bot API request latency by method", ["method"]
+)
+REQUESTS = metrics.counter(
+    "dowlander_telegram_requests_total", "Bot API requests by method and HTTP status", ["method", "status"]
+)
+RETRIES = metrics.counter(
+    "dowlander_telegram_retries_total", "Bot API requests retried by the transport", ["method", "reason"]
+)
+
+
+def _file_size(f):
+    try:
+        return os.fstat(f.fileno()).st_size - f.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pos = f.tell()
+        f.seek(0, os.SEEK_END)
+        size = f.tell() - pos
+        f.seek(pos)
+        return size
+
+
+def _quote(value):
+    return str(value).replace("\\", "\\\\").replace('"', "%22").replace("\r", "").replace("\n", "")
+
+
+class MultipartStream:
+    """multipart/form-data, що читається шматками (read / ітерація) з відомою довжиною."""
+
+    def __init__(self, files, chunk_size=64 * 1024):
+        self.chunk_size = chunk_size
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.parts = []
+        for field, value in files.items():
+            name = field
+            if isinstance(value, tuple):
+                name, value = value[0], value[1]
+            elif hasattr(value, "name") and isinstance(value.name, str):
+                name = os.path.basename(value.name)
+            header = (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{_quote(field)}"; filename="{_quote(name)}"\r\n'
+                f"Content-Type: application/octet-stream\r\n\r\n"
+            ).encode("utf-8")
+            if isinstance(value, str):
+                value = value.encode("utf-8")
+            if isinstance(value, (bytes, bytearray)):
+                self.parts.append((header, io.BytesIO(value), len(value)))
+            else:
+                self.parts.append((header, value, _file_size(value)))
+        self.footer = f"--{self.boundary}--\r\n".encode("utf-8")
+        self.length = sum(len(h) + size + 2 for h, _, size in self.parts) + len(self.footer)
+        self._chunks = self._generate()
+        self._buf = b""
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return self._chunks
+
+    def _generate(self):
+        for header, f, size in self.parts:
+            yield header
+            left = size
+            while left > 0:
+                chunk = f.read(min(self.chunk_size, left))
+                if not chunk:
+                    raise IOError("File shrank during upload")
+                left -= len(chunk)
+                yield chunk
+            yield b"\r\n"
+        yield self.footer
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._buf + b"".join(self._chunks)
+        while len(self._buf) < size:
+            try:
+                self._buf += next(self._chunks)
+            except StopIteration:
+                break
+        data, self._buf = self._buf[:size], self._buf[size:]
+        return data
+
+
+def _file_objects(files):
+    for value in (files or {}).values():
+        f = value[1] if isinstance(value, tuple) else value
+        if hasattr(f, "seek"):
+            yield f
+
+
+def _not_sent(e):
+    # З'єднання не встановилось — сервер запиту точно не бачив
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class Transport:
+    def __init__(self, pool_size=10, chunk_size=64 * 1024, connect_timeout=5, read_timeout=30,
+                 upload_timeout=300, retries=3, backoff=0.5, backoff_max=8):
+        self.chunk_size = chunk_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.upload_timeout = upload_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        # Один хост (Bot API) — один пул на pool_size з'єднань, по одному на потік
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def __call__(self, method, url, params=None, files=None, timeout=None, proxies=None, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        read = self.upload_timeout if files else self.read_timeout
+        if isinstance(timeout, tuple) and timeout[1] and timeout[1] > read:
+            # getUpdates з довгим опитуванням сам просить більший таймаут
+            read = timeout[1]
+        positions = [(f, f.tell()) for f in _file_objects(files)]
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                r = self._send(method, url, params, files, (self.connect_timeout, read), proxies)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # Таймаути теж у гістограмі: саме вони — найдовші запити
+                REQUEST_SECONDS.observe(time.perf_counter() - start, method=api_method)
+                REQUESTS.inc(method=api_method, status="error")
+                if attempt == self.retries or not (api_method in IDEMPOTENT or _not_sent(e)):
+                    raise
+                reason = "timeout" if isinstance(e, requests.Timeout) else "connection"
+            else:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, method=api_method)
+                REQUESTS.inc(method=api_method, status=r.status_code)
+                if r.status_code not in RETRY_STATUS or api_method not in IDEMPOTENT or attempt == self.retries:
+                    return r
+                reason = str(r.status_code)
+            RETRIES.inc(method=api_method, reason=reason)
+            # Повна випадкова пауза: потоки, що впали разом, не повторюють разом
+            delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+            logging.warning(f"Bot API {api_method} failed ({reason}), retry in {delay:.1f}s")
+            time.sleep(delay)
+            for f, pos in positions:
+                f.seek(pos)
+
+    def _send(self, method, url, params, files, timeout, proxies):
+        if files:
+            body = MultipartStream(files, self.chunk_size)
+            return self.session.request(
+                method, url, params=params, data=body,
+                headers={"Content-Type": body.content_type},
+                timeout=timeout, proxies=proxies
+            )
+        return self.session.request(method, url, params=params, timeout=timeout, proxies=proxies)
+
+
+def install(apihelper, api_url=None, **options):
+    """Підключає транспорт до telebot. api_url — локальний Bot API сервер (файли до 2 ГБ),
+    options — параметри Transport (пул, таймаути, повтори)."""
+    if api_url:
+        api_url = api_url.rstrip("/")
+        apihelper.API_URL = api_url + "/bot{0}/{1}"
+        apihelper.FILE_URL = api_url + "/file/bot{0}/{1}"
+    transport = Transport(**options)
+    apihelper.CUSTOM_REQUEST_SENDER = transport
+    return transport
@@ -0,0 +1,222 @@
+import copy
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+
+from ydlpool import load_yt_dlp
+
+# ============================================================
+#             НОРМАЛІЗАЦІЯ ПОСИЛАНЬ + КЕШ МЕТАДАНИХ
+# ============================================================
+# youtu.be / shorts / m.youtube.com -> youtube.com/watch?v=ID,
+# короткі посилання TikTok / Pinterest -> повний URL,
+# трекінгові параметри (igsh, si, utm_* ...) відкидаються.
+# Посилання на інші сайти (підписані CDN-посилання тощо) лишаються як є,
+# крім utm_*, fbclid і gclid.
+
+TRACKING_PARAMS = {
+    "si", "feature", "pp", "igsh", "igshid", "img_index", "fbclid", "gclid", "ref", "ref_src",
+    "is_from_webapp", "sender_device", "_r", "_t", "share_app_id", "share_link_id", "utm_id",
+}
+
+# Для невідомих сайтів прибираємо лише те, що точно не впливає на відповідь
+GENERIC_TRACKING_PARAMS = {"fbclid", "gclid"}
+
+SHORT_LINK_HOSTS = {"vm.tiktok.com", "vt.tiktok.com", "pin.it"}
+
+# Платформи, чиї посилання можна переписувати повністю
+KNOWN_HOSTS = (
+    "youtube.com", "youtu.be", "youtube-nocookie.com", "tiktok.com", "instagram.com",
+    "facebook.com", "fb.watch", "twitter.com", "x.com", "pinterest.com", "pin.it",
+)
+
+YT_ID = re.compile(r"^[\w-]{11}$")
+
+URL_RE = re.compile(r"https?://[^\s<>\"']+", re.I)
+
+
+class TTLCache:
+    """LRU-словник з обмеженням розміру і часом життя записів."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                if item is not None:
+                    del self.data[key]
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic(), value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+
+# Короткі посилання живуть довго — кешуємо результат редіректу
+_short_links = TTLCache(10000, 24 * 3600)
+
+
+def resolve_short_link(url, timeout=5):
+    resolved = _short_links.get(url)
+    if resolved:
+        return resolved
+    try:
+        r = requests.head(url, allow_redirects=True, timeout=timeout,
+                          headers={"User-Agent": "Mozilla/5.0"})
+        resolved = r.url
+    except requests.RequestException as e:
+        logging.warning(f"Short link not resolved: {url} ({e})")
+        return url
+    _short_links.put(url, resolved)
+    return resolved
+
+
+def _strip_query(query):
+    params = [
+        (k, v) for k, v in parse_qsl(query, keep_blank_values=False)
+        if k not in TRACKING_PARAMS and not k.startswith("utm_")
+    ]
+    return urlencode(sorted(params))
+
+
+def _strip_generic_query(query):
+    # Порядок, кодування і порожні значення — як в оригіналі
+    kept = []
+    for pair in query.split("&"):
+        name = pair.split("=", 1)[0]
+        if name and (name in GENERIC_TRACKING_PARAMS or name.startswith("utm_")):
+            continue
+        kept.append(pair)
+    return "&".join(kept)
+
+
+def canonicalize(url, resolve=True, keep_playlist=False):
+    """keep_playlist — лишити list= у посиланнях YouTube (користувач качає альбоми)."""
+    url = url.strip()
+    if not re.match(r"^https?://", url, re.I):
+        url = "https://" + url
+    parts = urlsplit(url)
+    host = parts.hostname.lower() if parts.hostname else ""
+    if not any(host == h or host.endswith("." + h) for h in KNOWN_HOSTS):
+        query = _strip_generic_query(parts.query)
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+    path = re.sub(r"/{2,}", "/", parts.path)
+
+    if resolve and (host in SHORT_LINK_HOSTS or (host.endswith("tiktok.com") and path.startswith("/t/"))):
+        resolved = resolve_short_link(url)
+        if resolved != url:
+            return canonicalize(resolved, resolve=False, keep_playlist=keep_playlist)
+
+    for prefix in ("www.", "m.", "mobile."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+
+    # YouTube
+    if host in ("youtu.be", "youtube.com", "music.youtube.com", "youtube-nocookie.com"):
+        video_id = None
+        segs = [s for s in path.split("/") if s]
+        if host == "youtu.be" and segs:
+            video_id = segs[0]
+        elif segs and segs[0] in ("shorts", "live", "embed", "v") and len(segs) > 1:
+            video_id = segs[1]
+        elif path == "/watch":
+            video_id = dict(parse_qsl(parts.query)).get("v")
+        if video_id and YT_ID.match(video_id):
+            playlist = dict(parse_qsl(parts.query)).get("list") if keep_playlist else None
+            if playlist:
+                return f"https://www.youtube.com/watch?v={video_id}&list={playlist}"
+            return f"https://www.youtube.com/watch?v={video_id}"
+
+    # TikTok: /@user/video/ID, /@user/photo/ID
+    if host.endswith("tiktok.com"):
+        m = re.match(r"^/(@[^/]+)/(video|photo)/(\d+)", path)
+        if m:
+            return f"https://www.tiktok.com/{m.group(1)}/{m.group(2)}/{m.group(3)}"
+
+    # Instagram: /reel/CODE, /reels/CODE, /p/CODE, /tv/CODE
+    if host.endswith("instagram.com"):
+        m = re.match(r"^/(?:[^/]+/)?(p|reels?|tv)/([\w-]+)", path)
+        if m:
+            kind = "reel" if m.group(1).startswith("reel") else m.group(1)
+            return f"https://www.instagram.com/{kind}/{m.group(2)}/"
+
+    query = _strip_query(parts.query)
+    netloc = parts.netloc.lower()
+    return urlunsplit((parts.scheme.lower(), netloc, path or "/", query, ""))
+
+
+def extract_urls(text, limit=None):
+    """Усі посилання з тексту повідомлення, без повторів, у порядку появи."""
+    found = []
+    for m in URL_RE.finditer(text or ""):
+        url = m.group(0).rstrip(".,;:!?]}»")
+        # Дужка в кінці — розділовий знак тексту, якщо в посиланні немає парної "("
+        while url.endswith(")") and url.count(")") > url.count("("):
+            url = url[:-1].rstrip(".,;:!?]}»")
+        if url not in found:
+            found.append(url)
+            if limit and len(found) >= limit:
+                break
+    return found
+
+
+_extractors = None
+
+
+def _extractor_for(url):
+    global _extractors
+    if _extractors is None:
+        _extractors = [ie for ie in load_yt_dlp().extractor.gen_extractor_classes() if ie.ie_key() != "Generic"]
+    for ie in _extractors:
+        if ie.suitable(url):
+            return ie
+    return None
+
+
+def media_id_from_url(url):
+    # (екстрактор, id відео) прямо з URL, без мережевих запитів
+    ie = _extractor_for(url)
+    if ie is None:
+        return None
+    video_id = ie.get_temp_id(url)
+    return (ie.ie_key(), video_id) if video_id else None
+
+
+def extractor_key(url):
+    # Ключ екстрактора, який обробить URL; решту бере Generic
+    ie = _extractor_for(url)
+    return ie.ie_key() if ie else "Generic"
+
+
+class MetadataCache(TTLCache):
+    """Результати extract_info(download=False) за канонічним id.
+
+    Посилання на формати в метаданих живуть обмежений час (у YouTube — години),
+    тому TTL короткий. Кожен get повертає окрему копію.
+    """
+
+    def get(self, key):
+        info = super().get(key)
+        return copy.deepcopy(info) if info is not None else None
+
+    def put(self, key, info):
+        super().put(key, copy.deepcopy(info))
@@ -0,0 +1,108 @@
+import itertools
+import logging
+import queue
+import threading
+
+# ============================================================
+#              ПУЛ ВОРКЕРІВ ДЛЯ ЗАВАНТАЖЕНЬ
+# ============================================================
+# Фіксована кількість потоків + обмежена черга з пріоритетами
+# (менше значення — раніше; в межах пріоритету — FIFO).
+# Замість окремого потоку на кожне посилання.
+# Один чат виконує не більше per_chat задач одночасно: решта посилань його
+# повідомлення чекає, поки звільниться місце, а воркери беруть інші чати.
+
+ACCEPTED = "accepted"
+QUEUE_FULL = "queue_full"
+CHAT_LIMIT = "chat_limit"
+
+DEFAULT_PRIORITY = 1
+
+
+class DownloadPool:
+    def __init__(self, handler, workers=3, queue_size=50, per_chat=2):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.per_chat = max(1, per_chat)
+        self.queue = queue.PriorityQueue(maxsize=max(1, queue_size))
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.chat_jobs = {}   # chat_id -> кількість задач (в черзі + активні)
+        self.chat_running = {}  # chat_id -> активні задачі
+        self.deferred = {}    # chat_id -> задачі, відкладені через ліміт чату (у порядку черги)
+        self.pending = 0      # задачі, що чекають (у черзі + відкладені)
+        self.by_priority = {}  # пріоритет -> задач у черзі
+        self.running = 0      # задачі, що виконуються зараз
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            th = threading.Thread(target=self._worker, name=f"download-{i}", daemon=True)
+            th.start()
+            self.threads.append(th)
+
+    def submit(self, chat_id, *args, priority=DEFAULT_PRIORITY):
+        """Повертає (статус, позиція в черзі). Позиція 0 — задача стартує одразу."""
+        return self.submit_many(chat_id, [args], priority)
+
+    def submit_many(self, chat_id, jobs, priority=DEFAULT_PRIORITY):
+        """Кілька задач одного повідомлення: приймаються всі разом або жодна.
+        Позиція — для першої з них (попереду лише задачі з тим самим або вищим пріоритетом)."""
+        with self.lock:
+            if self.chat_jobs.get(chat_id, 0) >= self.per_chat:
+                return CHAT_LIMIT, None
+            # Відкладені задачі теж займають місце: вони повернуться в чергу
+            if self.queue.maxsize - self.pending < len(jobs):
+                return QUEUE_FULL, None
+            ahead = sum(n for p, n in self.by_priority.items() if p <= priority)
+            for args in jobs:
+                self.queue.put_nowait((priority, next(self.seq), chat_id, args))
+            self.chat_jobs[chat_id] = self.chat_jobs.get(chat_id, 0) + len(jobs)
+            self.pending += len(jobs)
+            self.by_priority[priority] = self.by_priority.get(priority, 0) + len(jobs)
+            free = self.workers - self.running
+            position = max(0, ahead + 1 - free)
+        return ACCEPTED, position
+
+    def stats(self):
+        with self.lock:
+            return {"pending": self.pending, "running": self.running, "workers": self.workers}
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            priority, _, chat_id, args = item
+            with self.lock:
+                if self.chat_running.get(chat_id, 0) >= self.per_chat:
+                    # Чат уже займає свої per_chat воркерів — задача повернеться
+                    # в чергу (на своє місце), коли одна з них завершиться
+                    self.deferred.setdefault(chat_id, []).append(item)
+                    self.queue.task_done()
+                    continue
+                self.chat_running[chat_id] = self.chat_running.get(chat_id, 0) + 1
+                self.pending -= 1
+                self.running += 1
+                left = self.by_priority[priority] - 1
+                if left:
+                    self.by_priority[priority] = left
+                else:
+                    del self.by_priority[priority]
+            try:
+                self.handler(*args)
+            except Exception as e:
+                logging.error(f"WORKER ERROR: {e}")
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    for counts in (self.chat_jobs, self.chat_running):
+                        left = counts.get(chat_id, 1) - 1
+                        if left > 0:
+                            counts[chat_id] = left
+                        else:
+                            counts.pop(chat_id, None)
+                    waiting = self.deferred.get(chat_id)
+                    if waiting:
+                        self.queue.put_nowait(waiting.pop(0))
+                        if not waiting:
+                            del self.deferred[chat_id]
+                self.queue.task_done()
@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import registry as metrics
+
+# ============================================================
+#          ПУЛ ЕКЗЕМПЛЯРІВ YoutubeDL (по профілю платформи)
+# ============================================================
+# Конструктор YoutubeDL щоразу відбирає ~1800 екстракторів (~0.1 с CPU),
+# а перший виклик екстрактора ще й імпортує його модуль. Тому список
+# екстракторів будується один раз (шаблон), а екземпляри живуть довго:
+# задача бере вільний екземпляр свого профілю і повертає його після
+# завантаження, тож їх не більше, ніж воркерів на профіль.
+# На час задачі підставляються її опції (outtmpl, paths, формат, cookies,
+# заголовки, хуки, постпроцесори); cookies і HTTP-з'єднання кожна задача
+# отримує нові — нічого не переходить від одного користувача до іншого.
+#
+# yt_dlp імпортується лише тут і лише при першій потребі: веб-процесу, який
+# сам нічого не качає, потрібен лише список екстракторів (id відео з посилання).
+
+SESSIONS = metrics.counter(
+    "dowlander_ydl_sessions_total", "Downloads by option profile and YoutubeDL instance reuse", ["profile", "instance"]
+)
+
+BASE_OPTS = {"quiet": True, "no_warnings": True, "noprogress": True}
+
+_import_lock = threading.Lock()
+
+
+def load_yt_dlp():
+    # Пакет з циклічними імпортами: прогрів і перша задача, що імпортують його
+    # одночасно з різних потоків, бачать напівініціалізований yt_dlp.utils
+    with _import_lock:
+        import yt_dlp
+    return yt_dlp
+
+
+# Стан, який YoutubeDL накопичує за одне завантаження
+_COUNTERS = {"_download_retcode": 0, "_num_downloads": 0, "_num_videos": 0, "_playlist_level": 0}
+
+
+class YdlPool:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.idle = {}          # профіль -> вільні екземпляри
+        self.created = 0
+        self.template_lock = threading.Lock()
+        self.template = None    # екстрактори, відібрані звичайним конструктором
+
+    @contextmanager
+    def session(self, profile, opts):
+        """YoutubeDL з опціями задачі; після блоку екземпляр повертається в пул."""
+        if not self.enabled:
+            # Як раніше: окремий екземпляр на кожну задачу
+            yt_dlp = load_yt_dlp()
+            SESSIONS.inc(profile=profile, instance="new")
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                yield ydl
+            return
+
+        ydl = self._take(profile)
+        SESSIONS.inc(profile=profile, instance="new" if ydl is None else "reused")
+        if ydl is None:
+            ydl = self._create()
+        try:
+            _apply(ydl, opts)
+            yield ydl
+        finally:
+            # Стан задачі скидається і при помилці: хуки, cookies, з'єднання
+            try:
+                _apply(ydl, {})
+            except Exception as e:
+                logging.error(f"YDL RESET ERROR: {e}")
+            else:
+                with self.lock:
+                    self.idle.setdefault(profile, []).append(ydl)
+
+    def warm_up(self, profiles):
+        """Імпорт yt_dlp і екстракторів, по екземпляру на профіль — до першої задачі.
+
+        Назва профілю — ключ екстрактора; його модуль імпортується одразу.
+        """
+        started = time.perf_counter()
+        from urls import extractor_key
+        # Перший пошук екстрактора компілює регулярні вирази всіх ~1800 класів
+        extractor_key("https://example.com/")
+        if not self.enabled:
+            return time.perf_counter() - started
+        for profile in profiles:
+            ydl = self._create()
+            try:
+                ydl.get_info_extractor(profile)
+            except Exception:
+                pass   # профіль без однойменного екстрактора ("default")
+            with self.lock:
+                self.idle.setdefault(profile, []).append(ydl)
+        elapsed = time.perf_counter() - started
+        logging.info(f"YoutubeDL warm-up: {len(profiles)} profiles in {elapsed:.2f}s")
+        return elapsed
+
+    def stats(self):
+        with self.lock:
+            return {"created": self.created, "idle": sum(len(v) for v in self.idle.values())}
+
+    def _take(self, profile):
+        with self.lock:
+            free = self.idle.get(profile)
+            return free.pop() if free else None
+
+    def _create(self):
+        yt_dlp = load_yt_dlp()
+        with self.template_lock:
+            if self.template is None:
+                self.template = yt_dlp.YoutubeDL(dict(BASE_OPTS))._ies
+        ydl = yt_dlp.YoutubeDL(dict(BASE_OPTS), auto_init=False)
+        for ie in self.template.values():
+            ydl.add_info_extractor(ie if isinstance(ie, type) else type(ie)())
+        # Оброблені конструктором опції — основа для кожної задачі
+        ydl._base_params = dict(ydl.params)
+        with self.lock:
+            self.created += 1
+        return ydl
+
+
+def _apply(ydl, opts):
+    """Повторює ту частину YoutubeDL.__init__, що залежить від опцій."""
+    from yt_dlp.postprocessor import get_postprocessor
+    from yt_dlp.utils import POSTPROCESS_WHEN
+    from yt_dlp.utils.networking import HTTPHeaderDict
+
+    base = ydl._base_params
+    params = dict(base)
+    params.update(opts)
+    params["http_headers"] = HTTPHeaderDict(base["http_headers"], opts.get("http_headers"))
+    params["outtmpl"] = opts.get("outtmpl", {})
+    ydl.params = params
+    ydl._parse_outtmpl()
+
+    fmt = params.get("format")
+    ydl.format_selector = fmt if fmt in (None, "-") or callable(fmt) else ydl.build_format_selector(fmt)
+
+    for name, value in _COUNTERS.items():
+        setattr(ydl, name, value)
+    ydl._playlist_urls = set()
+    ydl._printed_messages = set()
+    ydl._YoutubeDL__header_cookies = []
+
+    # Нові cookies (з cookiefile задачі або порожні) і нові з'єднання з новими заголовками.
+    # Екстрактори лишаються, але ініціалізуються знову: згода, логін тощо живуть у cookies
+    ydl.__dict__.pop("cookiejar", None)
+    _close_director(ydl)
+    _run_close_hooks(ydl)
+    for ie in ydl._ies_instances.values():
+        ie._ready = False
+
+    ydl._progress_hooks = []
+    ydl._postprocessor_hooks = []
+    ydl._post_hooks = []
+    ydl._pps = {k: [] for k in POSTPROCESS_WHEN}
+    for ph in params.get("post_hooks", []):
+        ydl.add_post_hook(ph)
+    for ph in params.get("progress_hooks", []):
+        ydl.add_progress_hook(ph)
+    for ph in params.get("postprocessor_hooks", []):
+        ydl.add_postprocessor_hook(ph)
+    for pp_def_raw in params.get("postprocessors", []):
+        pp_def = dict(pp_def_raw)
+        when = pp_def.pop("when", "post_process")
+        ydl.add_post_processor(get_postprocessor(pp_def.pop("key"))(ydl, **pp_def), when=when)
+
+
+def _run_close_hooks(ydl):
+    # Як у YoutubeDL.close(): YoutubeIE при ініціалізації реєструє тут свій
+    # PoTokenRequestDirector, і без цього кожна задача лишала б по одному
+    hooks, ydl._close_hooks = ydl._close_hooks, []
+    for hook in hooks:
+        try:
+            hook()
+        except Exception as e:
+            logging.error(f"YDL CLOSE HOOK ERROR: {e}")
+
+
+def _close_director(ydl):
+    director = ydl.__dict__.pop("_request_director", None)
+    if director is not None:
+        try:
+            director.close()
+        except Exception as e:
+            logging.error(f"YDL CLOSE ERROR: {e}")
+